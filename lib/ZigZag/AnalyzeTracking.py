@@ -1,12 +1,15 @@
 from __future__ import print_function
 import os.path
-from ZigZag.TrackUtils import FilterMHTTracks, CreateSegments, MakeContingency,\
-                              FilterSegments
-from ZigZag.TrackFileUtils import ReadTracks
+from ZigZag.TrackUtils import FilterMHTTracks, CreateSegmentTable, \
+                              FilterSegments, SegmentIDs, \
+                              MakeContingencyArrays, base_track_dtype
+from ZigZag.TrackFileUtils import ReadTracks, ReadCorners
 from ZigZag.ListRuns import Sims_of_MultiSim
 import ZigZag.Trackers as Trackers
 import ZigZag.ParamUtils as ParamUtils
 import numpy as np
+import hashlib
+import pickle
 import ZigZag.Analyzers as Analyzers
 from la import larry        # Labeled arrays
 
@@ -80,29 +83,179 @@ def DisplayAnalysis(analysis, skillName,
 
 
 
-def AnalyzeTrackings(simName, simParams, skillNames, trackRuns, path='.',
-                     tag_filters=None) :
-    dirName = os.path.join(path, simName)
-    trackFile = os.path.join(dirName, simParams['noisyTrackFile'])
+# Bump this whenever the contents of the truth cache files change,
+# so that any older cache files get rebuilt.
+_truthcache_version = 1
 
-    tagFile = os.path.join(dirName, simParams['simTagFile'])
-    simTags = ParamUtils.ReadSimTagFile(tagFile)
-    keeperIDs = ParamUtils.process_tag_filters(simTags, tag_filters)
+def _truthcache_key(trackFile) :
+    fileStat = os.stat(trackFile)
+    return np.array([fileStat.st_mtime, fileStat.st_size,
+                     _truthcache_version], dtype=float)
 
+def _process_truth(trackFile) :
     (true_tracks, true_falarms) = FilterMHTTracks(*ReadTracks(trackFile))
     lastFrame = (max(trk['frameNums'][-1] for trk in
                     (true_tracks + true_falarms)) if
                  len(true_tracks) + len(true_falarms) > 0 else 0)
-    true_AssocSegs, trackIndices = CreateSegments(true_tracks,
-                                                  retindices=True,
-                                                  lastFrame=lastFrame)
-    # TODO: need to filter trackIndices as well!
-    true_AssocSegs = FilterSegments(keeperIDs, true_AssocSegs)
+    return (true_tracks, true_falarms, lastFrame,
+            CreateSegmentTable(true_tracks, lastFrame=lastFrame),
+            CreateSegmentTable(true_falarms, lastFrame=lastFrame))
+
+def _save_truthcache(cacheFile, cacheKey, truth) :
+    true_tracks, true_falarms, lastFrame, assocSegs, falarmSegs = truth
+    allTracks = true_tracks + true_falarms
+    trackOffsets = np.zeros(len(allTracks) + 1, dtype=np.int64)
+    np.cumsum([len(trk) for trk in allTracks], out=trackOffsets[1:])
+    cells = (np.concatenate(allTracks) if len(allTracks) > 0 else
+             np.empty(0, dtype=base_track_dtype))
+
+    # Write to a temporary file first so that a reader never
+    # sees a partially written cache file.
+    tmpFile = "%s.%d.tmp" % (cacheFile, os.getpid())
+    dataFile = open(tmpFile, 'wb')
+    try :
+        np.savez(dataFile, cacheKey=cacheKey, lastFrame=np.array(lastFrame),
+                 trackCnt=np.array(len(true_tracks)),
+                 trackOffsets=trackOffsets, cells=cells,
+                 assocSegs=assocSegs, falarmSegs=falarmSegs)
+        dataFile.close()
+        os.rename(tmpFile, cacheFile)
+    finally :
+        dataFile.close()
+        if os.path.exists(tmpFile) :
+            os.remove(tmpFile)
+
+def _load_truthcache(cacheFile, cacheKey) :
+    data = np.load(cacheFile)
+    try :
+        if not np.array_equal(data['cacheKey'], cacheKey) :
+            return None
+
+        trackOffsets = data['trackOffsets']
+        trackCnt = int(data['trackCnt'])
+        cells = data['cells']
+        allTracks = [cells[start:stop] for start, stop in
+                     zip(trackOffsets[:-1], trackOffsets[1:])]
+        return (allTracks[:trackCnt], allTracks[trackCnt:],
+                data['lastFrame'].item(),
+                data['assocSegs'], data['falarmSegs'])
+    finally :
+        data.close()
+
+def LoadTruthSegments(trackFile, useCache=True) :
+    """
+    Load the truth tracks and false alarms from *trackFile*, filtered by
+    :func:`FilterMHTTracks`, along with the last frame of the truth data and
+    the segment tables (see :func:`CreateSegmentTable`) of the tracks and of
+    the false alarms, cut off at that last frame.  No tag filtering is done.
+
+    Returns *true_tracks*, *true_falarms*, *lastFrame*, *assocSegs*,
+    *falarmSegs*
+
+    Unless *useCache* is False, the results are cached in a file next to
+    *trackFile*, and are reused for as long as *trackFile* has the same
+    modification time and size.  Problems with the cache file are
+    not fatal; the results are just computed again.
+    """
+    if not useCache :
+        return _process_truth(trackFile)
 
-    true_FAlarmSegs, falarmIndices = CreateSegments(true_falarms,
-                                                    retindices=True,
-                                                    lastFrame=lastFrame)
-    true_FAlarmSegs = FilterSegments(keeperIDs, true_FAlarmSegs)
+    cacheFile = trackFile + "_segcache.npz"
+    cacheKey = _truthcache_key(trackFile)
+
+    if os.path.exists(cacheFile) :
+        try :
+            truth = _load_truthcache(cacheFile, cacheKey)
+            if truth is not None :
+                return truth
+        except Exception as err :
+            print("WARNING: Could not read %s: %s" % (cacheFile, err))
+
+    truth = _process_truth(trackFile)
+    try :
+        _save_truthcache(cacheFile, cacheKey, truth)
+    except (IOError, OSError) as err :
+        print("WARNING: Could not write %s: %s" % (cacheFile, err))
+
+    return truth
+
+# Bump this whenever the contents of the analysis store change.
+_analysisstore_version = 2
+
+def _file_md5(fileName) :
+    digest = hashlib.md5()
+    with open(fileName, 'rb') as dataFile :
+        for chunk in iter(lambda : dataFile.read(1 << 20), b'') :
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _load_analysisstore(storeFile) :
+    if os.path.exists(storeFile) :
+        try :
+            with open(storeFile, 'rb') as dataFile :
+                store = pickle.load(dataFile)
+            if store.get('version', None) == _analysisstore_version :
+                return store
+        except Exception as err :
+            print("WARNING: Could not read %s: %s" % (storeFile, err))
+
+    return {'version': _analysisstore_version, 'runs': {}}
+
+def _save_analysisstore(storeFile, newEntries) :
+    """
+    Add the *newEntries* to the analysis store in *storeFile*.
+
+    The store is read again just before it is written, so entries
+    saved by another analysis of the same simulation in the meantime
+    are kept.  Only a write that lands between that read and the
+    rename can still be lost, which just means that some track runs
+    get scored again later.
+    """
+    tmpFile = "%s.%d.tmp" % (storeFile, os.getpid())
+    try :
+        store = _load_analysisstore(storeFile)
+        store['runs'].update(newEntries)
+        with open(tmpFile, 'wb') as dataFile :
+            pickle.dump(store, dataFile, pickle.HIGHEST_PROTOCOL)
+        os.rename(tmpFile, storeFile)
+    except (IOError, OSError) as err :
+        print("WARNING: Could not write %s: %s" % (storeFile, err))
+    finally :
+        if os.path.exists(tmpFile) :
+            os.remove(tmpFile)
+
+def AnalyzeTrackings(simName, simParams, skillNames, trackRuns, path='.',
+                     tag_filters=None) :
+    """
+    Compute the skill scores named in *skillNames* for each of the
+    *trackRuns* of the simulation *simName*, only counting the segments
+    that pass the *tag_filters*.
+
+    The contingency counts and skill scores of each track run are kept
+    in an analysis store in the simulation directory, keyed by the track
+    run and the tag filters.  A track run is only scored again when its
+    result file, the truth track file or the simTags file has changed
+    (or a new skill is asked for).  The result file is only hashed again
+    when its modification time or size has changed.
+
+    Returns a (Skills x TrackRuns) larry.
+    """
+    dirName = os.path.join(path, simName)
+    trackFile = os.path.join(dirName, simParams['noisyTrackFile'])
+    tagFile = os.path.join(dirName, simParams['simTagFile'])
+
+    # Anything that changes the truth segments changes every score.
+    truthKey = tuple(_truthcache_key(trackFile).tolist())
+    if tag_filters is not None and os.path.exists(tagFile) :
+        tagStat = os.stat(tagFile)
+        truthKey += (tagStat.st_mtime, tagStat.st_size)
+    filterKey = tuple(tag_filters) if tag_filters is not None else None
+
+    storeFile = os.path.join(dirName, simParams['analysis_stem'] +
+                                      "_store.pkl")
+    store = _load_analysisstore(storeFile)
+    newEntries = {}
+    truth = None
 
     # Initializing the analysis data, which will hold a table of analysis
     # results for this simulation
@@ -113,30 +266,131 @@ def AnalyzeTrackings(simName, simParams, skillNames, trackRuns, path='.',
     for trackerIndex, tracker in enumerate(trackRuns) :
         obvFilename = os.path.join(dirName, simParams['result_file'] +
                                             "_" + tracker)
-        (obvTracks, obvFAlarms) = FilterMHTTracks(*ReadTracks(obvFilename))
-        trk_segs = CreateSegments(obvTracks + obvFAlarms, lastFrame=lastFrame)
-        trk_segs = FilterSegments(keeperIDs, trk_segs)
-        truthTable = MakeContingency(true_AssocSegs + true_FAlarmSegs, trk_segs)
-
-        #print("Margin Sums: %d" % (len(truthTable['assocs_Correct']) +
-        #                           len(truthTable['assocs_Wrong']) +
-        #                           len(truthTable['falarms_Wrong']) +
-        #                           len(truthTable['falarms_Correct'])))
+        resultStat = os.stat(obvFilename)
+        resultStat = (resultStat.st_mtime, resultStat.st_size)
+
+        entry = store['runs'].get((tracker, filterKey), None)
+        if entry is None or entry['truthKey'] != truthKey :
+            entry = {'resultHash': None, 'resultStat': None,
+                     'truthKey': truthKey, 'counts': None, 'skills': {}}
+
+        if entry['resultStat'] != resultStat :
+            # The file may have just been touched or copied, so the
+            # scores are only thrown out if the contents have changed.
+            resultHash = _file_md5(obvFilename)
+            if entry['resultHash'] != resultHash :
+                entry = dict(entry, resultHash=resultHash, counts=None,
+                             skills={})
+            entry = dict(entry, resultStat=resultStat)
+            newEntries[(tracker, filterKey)] = entry
+
+        missingSkills = [skill for skill in skillNames if
+                         skill not in entry['skills']]
+        if len(missingSkills) > 0 :
+            if truth is None :
+                truth = _filtered_truth(trackFile, tagFile, tag_filters)
+
+            entry['counts'], skills = _score_trackrun(obvFilename,
+                                                      missingSkills, *truth)
+            entry['skills'].update(skills)
+            newEntries[(tracker, filterKey)] = entry
 
         for skillIndex, skill in enumerate(skillNames) :
-            analysis[skillIndex,
-                     trackerIndex] = Analyzers.skillcalcs[skill](
+            analysis[skillIndex, trackerIndex] = entry['skills'][skill]
+
+    if len(newEntries) > 0 :
+        _save_analysisstore(storeFile, newEntries)
+
+    # (Skills x TrackRuns)
+    return larry(analysis, labels)
+
+def _filtered_truth(trackFile, tagFile, tag_filters) :
+    """
+    Load the truth segments (see :func:`LoadTruthSegments`) and
+    apply the tag filters.
+    """
+    keeperIDs = ParamUtils.ReadKeeperIDs(tagFile, tag_filters)
+
+    (true_tracks, true_falarms, lastFrame,
+     true_AssocSegs, true_FAlarmSegs) = LoadTruthSegments(trackFile)
+    trackIndices = true_AssocSegs['trackIndex'].tolist()
+    # TODO: need to filter trackIndices as well!
+    true_AssocSegs = FilterSegments(keeperIDs, true_AssocSegs)
+
+    falarmIndices = true_FAlarmSegs['trackIndex'].tolist()
+    true_FAlarmSegs = FilterSegments(keeperIDs, true_FAlarmSegs)
+    true_SegIDs = SegmentIDs(np.concatenate((true_AssocSegs,
+                                             true_FAlarmSegs)))
+
+    return (keeperIDs, true_tracks, true_falarms, lastFrame, true_SegIDs,
+            trackIndices, falarmIndices)
+
+def _score_trackrun(obvFilename, skillNames, keeperIDs, true_tracks,
+                    true_falarms, lastFrame, true_SegIDs,
+                    trackIndices, falarmIndices) :
+    """
+    Compute the contingency counts and the skill scores of the
+    track run results in *obvFilename* against the truth.
+    """
+    (obvTracks, obvFAlarms) = FilterMHTTracks(*ReadTracks(obvFilename))
+    trk_segs = CreateSegmentTable(obvTracks + obvFAlarms,
+                                  lastFrame=lastFrame)
+    trk_segs = FilterSegments(keeperIDs, trk_segs)
+    truthTable = MakeContingencyArrays(true_SegIDs, SegmentIDs(trk_segs))
+
+    #print("Margin Sums: %d" % (len(truthTable['assocs_Correct']) +
+    #                           len(truthTable['assocs_Wrong']) +
+    #                           len(truthTable['falarms_Wrong']) +
+    #                           len(truthTable['falarms_Correct'])))
+    counts = dict((category, len(truthTable[category])) for category in
+                  ('assocs_Correct', 'assocs_Wrong',
+                   'falarms_Wrong', 'falarms_Correct'))
+
+    skills = {}
+    for skill in skillNames :
+        skills[skill] = Analyzers.skillcalcs[skill](
                                        tracks=obvTracks, falarms=obvFAlarms,
                                        truthTable=truthTable,
                                        true_tracks=true_tracks,
                                        true_falarms=true_falarms,
                                        track_indices=trackIndices,
                                        falarm_indices=falarmIndices)
-    # (Skills x TrackRuns)
-    return larry(analysis, labels)
+    return counts, skills
 
 
-from multiprocessing import Pool
+from multiprocessing import Pool, cpu_count
+
+class AnalysisArray(object) :
+    """
+    A labeled N-D array of analysis results that is preallocated from
+    all of the labels up front, so that results can be filled into their
+    slots as they come in, rather than assembled by merging larrys.
+
+    *labels* is a list of the labels for each axis.  Any slot that
+    never gets filled is NaN, just like a missing value in a larry.
+    """
+    def __init__(self, labels) :
+        self.label = [list(axisLabels) for axisLabels in labels]
+        self._labelindex = [dict((aLabel, index) for index, aLabel in
+                                 enumerate(axisLabels)) for
+                            axisLabels in self.label]
+        self.x = np.empty([len(axisLabels) for axisLabels in self.label])
+        self.x.fill(np.nan)
+
+    def put(self, key, values) :
+        """
+        Fill in *values* at *key*, which has a label (or None, for
+        the entire axis) for each axis.
+        """
+        index = tuple(slice(None) if aLabel is None else
+                      self._labelindex[axis][aLabel] for
+                      axis, aLabel in enumerate(key))
+        self.x[index] = values
+
+    def tolarry(self) :
+        """ Export the results as a larry """
+        return larry(self.x, [list(axisLabels) for axisLabels in self.label])
+
 
 def _analyze_trackings(simName, multiSim, skillNames, trackRuns, multiDir,
                        tag_filters) :
@@ -145,68 +399,87 @@ def _analyze_trackings(simName, multiSim, skillNames, trackRuns, multiDir,
         paramFile = os.path.join(dirName, "simParams.conf")
         print("Sim:", simName)
         simParams = ParamUtils.ReadSimulationParams(paramFile)
-        tagFile = os.path.join(dirName, simParams['simTagFile'])
-
-        if os.path.exists(tagFile) :
-            simTags = ParamUtils.ReadConfigFile(tagFile)
-        else :
-            simTags = None
 
         analysis = AnalyzeTrackings(simName, simParams, skillNames,
                                     trackRuns=trackRuns, path=multiDir,
                                     tag_filters=tag_filters)
-        analysis = analysis.insertaxis(axis=1, label=simName)
     except Exception as err :
         print(err)
         raise err
 
-    # (Skills x Sims x TrackRuns)
-    return analysis
-
-def MultiAnalyze(simNames, multiSim, skillNames,
-                 trackRuns, path='.', tag_filters=None) :
-    completeAnalysis = None
-    multiDir = os.path.join(path, multiSim)
+    # (Skills x TrackRuns)
+    return analysis.x
 
-    p = Pool()
+def _analyze_task(task) :
+    """
+    Unpack an analysis task from :func:`_fill_analysis` for use with
+    imap_unordered(), and return the results along with their key.
+    """
+    (keyPrefix, simName, multiSim, skillNames,
+     trackRuns, multiDir, tag_filters) = task
+    return (keyPrefix + (None, simName, None),
+            _analyze_trackings(simName, multiSim, skillNames, trackRuns,
+                               multiDir, tag_filters))
+
+def _fill_analysis(results, scenarioSims, skillNames, trackRuns, path,
+                   tag_filters) :
+    """
+    Analyze the sims of every scenario in *scenarioSims*, a list of
+    (keyPrefix, multiSim, simNames) tuples, and put each (Skills x TrackRuns)
+    analysis into *results* at keyPrefix + (None, simName, None).
 
-    # Now, go through each simulation and analyze them.
-    results = [p.apply_async(_analyze_trackings, (simName, multiSim, skillNames,
-                                                  trackRuns, multiDir,
-                                                  tag_filters)) for
-               simName in simNames]
+    All of the (scenario, sim) tasks go to one pool of processes in
+    chunks, and the results are put into *results* as they come back,
+    in whatever order they finish.
+    """
+    tasks = [(keyPrefix, simName, multiSim, skillNames, trackRuns,
+              os.path.join(path, multiSim), tag_filters) for
+             keyPrefix, multiSim, simNames in scenarioSims for
+             simName in simNames]
+    if len(tasks) == 0 :
+        return
 
-    p.close()
-    p.join()
+    p = Pool()
+    try :
+        # Just like Pool.map(), aim for about four chunks per process.
+        chunksize = max(1, len(tasks) // (4 * cpu_count()))
+        for key, analysis in p.imap_unordered(_analyze_task, tasks,
+                                              chunksize) :
+            results.put(key, analysis)
+    finally :
+        p.close()
+        p.join()
 
-    # FIXME: With the update larrys, this can probably be improved.
-    for res in results :
-        if completeAnalysis is None :
-            completeAnalysis = res.get()
-        else :
-            completeAnalysis = completeAnalysis.merge(res.get())
+def MultiAnalyze(simNames, multiSim, skillNames,
+                 trackRuns, path='.', tag_filters=None) :
+    # The sims are in sorted order, just like larry.merge() would leave them.
+    results = AnalysisArray([skillNames, sorted(set(simNames)), trackRuns])
+    _fill_analysis(results, [((), multiSim, simNames)], skillNames,
+                   trackRuns, path, tag_filters)
 
     # (Skills x Sims x TrackRuns)
-    return completeAnalysis
+    return results.tolarry()
 
 def MultiScenarioAnalyze(multiSims, skillNames, trackRuns,
                          path='.', tag_filters=None) :
-    completeAnalysis = None
-    for aScenario in multiSims :
-        simNames = Sims_of_MultiSim(aScenario, path)
-
-        # (Skills x Sims x TrackRuns)
-        res = MultiAnalyze(simNames, aScenario, skillNames,
-                           trackRuns, path=path, tag_filters=tag_filters)
-        res = res.insertaxis(axis=0, label=aScenario)
-
-        if completeAnalysis is None :
-            completeAnalysis = res
-        else :
-            completeAnalysis = completeAnalysis.merge(res)
+    scenarioSims = [((aScenario,), aScenario,
+                     Sims_of_MultiSim(aScenario, path)) for
+                    aScenario in multiSims]
+    allSims = set()
+    for keyPrefix, aScenario, simNames in scenarioSims :
+        allSims.update(simNames)
+
+    # The scenarios and the sims are in sorted order, just
+    # like larry.merge() would leave them.
+    results = AnalysisArray([sorted(set(multiSims)), skillNames,
+                             sorted(allSims), trackRuns])
+
+    # One pool for the sims of all of the scenarios
+    _fill_analysis(results, scenarioSims, skillNames, trackRuns, path,
+                   tag_filters)
 
     # (Scene x Skills x Sims x TrackRuns)
-    return completeAnalysis
+    return results.tolarry()
 
 
 ###########################################
@@ -225,13 +498,18 @@ def SingleTracking(simFile, simName, simParams, trackConfs, path='.') :
     # Now load that one file
     storedTrackConfs = ParamUtils.LoadTrackerParams([storedConfFile])
 
+    # Load the corner data just once for all of the track runs.
+    cornerInfo = ReadCorners(os.path.join(simDir, simParams['inputDataFile']),
+                             path=simDir)
+
     for trackRun in trackConfs :
         tracker = trackConfs[trackRun]['algorithm']
         # This is where the tracking is performed!
         # Trackers.trackerList is a dictionary of Tracker objects
         Trackers.trackerList[tracker](trackRun, simParams.copy(),
                                       trackConfs[trackRun].copy(),
-                                      returnResults=False, path=simDir)
+                                      returnResults=False, path=simDir,
+                                      cornerInfo=cornerInfo)
 
         # We want this simulation to know which trackers they used,
         # so we will update the file after each successful tracking operation.
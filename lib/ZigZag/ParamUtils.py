@@ -1,5 +1,6 @@
 import os       # for os.path.isfile(), os.access(), os.R_OK
 import argparse
+import numpy as np
 from configobj import ConfigObj, flatten_errors
 from Sim import gen_modelList, noise_modelList, motion_modelList, init_modelList
 from validate import Validator
@@ -100,6 +101,35 @@ def process_tag_filters(simTags, filters, ignore_missing=True) :
 
     return keepers
 
+# Cache of the sorted keeper ID arrays from ReadKeeperIDs(), keyed by
+# the tag file (and its modification time and size) and the tag filters.
+_keeperCache = {}
+
+def ReadKeeperIDs(tagFile, filters, ignore_missing=True) :
+    """
+    Read the simTags file *tagFile* and resolve the tag *filters*
+    (see :func:`process_tag_filters`) into a sorted array of the unique
+    cornerIDs to keep.  Returns None if no filtering is to be done.
+
+    The result is cached, so repeated calls for the same simulation and
+    tag filters only cost a stat() of the tag file.  The returned array
+    is read-only because it is shared.
+    """
+    if filters is None or not os.path.exists(tagFile) :
+        return None
+
+    fileStat = os.stat(tagFile)
+    cacheKey = (os.path.abspath(tagFile), fileStat.st_mtime, fileStat.st_size,
+                tuple(filters), ignore_missing)
+    if cacheKey not in _keeperCache :
+        keepers = process_tag_filters(ReadSimTagFile(tagFile), filters,
+                                      ignore_missing)
+        keeperIDs = np.unique(np.array(sorted(keepers), dtype=int))
+        keeperIDs.setflags(write=False)
+        _keeperCache[cacheKey] = keeperIDs
+
+    return _keeperCache[cacheKey]
+
 
 def ReadSimTagFile(filename) :
     if not os.path.exists(filename) :
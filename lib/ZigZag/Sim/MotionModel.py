@@ -9,10 +9,31 @@ def _motion_register(modelclass, name, argValidator) :
 
     motion_modelList[name] = (modelclass, argValidator)
 
+def _step_size(xSpeed) :
+    """
+    The size of the random draws for a step of the tracks with speeds
+    *xSpeed*.  That is None (a single draw) for a scalar speed, so that
+    one track at a time still draws just like it always has.
+    """
+    shape = np.shape(xSpeed)
+    return shape if len(shape) > 0 else None
+
 #############################             
 #   Motion Models
 #############################
 class MotionModel(object) :
+    """
+    Calling a motion model with (deltaT, xSpeed, ySpeed) steps a track
+    forward, returning (dFrame, dx, dy, dVelx, dVely).  The speeds may
+    also be arrays, to step many tracks at once.
+
+    Models with *hasTrajectory* set to True also have a
+    *trajectory(stepCnt, deltaT, xSpeed, ySpeed)* method that returns
+    the (dFrames, dxs, dys) increments of *stepCnt* steps of each track
+    at once, as arrays with the steps along the last axis.
+    """
+    hasTrajectory = False
+
     def __init__(self) :
         pass
 
@@ -49,10 +70,31 @@ class ConstVel_Model(MotionModel) :
         dx = self.deltaFrame * deltaT * xSpeed
         dy = self.deltaFrame * deltaT * ySpeed
         velModify = self.accelTerm * deltaT
-        dVelx = np.random.uniform(-velModify, velModify)
-        dVely = np.random.uniform(-velModify, velModify)
+        size = _step_size(xSpeed)
+        dVelx = np.random.uniform(-velModify, velModify, size)
+        dVely = np.random.uniform(-velModify, velModify, size)
         return self.deltaFrame, dx, dy, dVelx, dVely
 
+    hasTrajectory = True
+
+    def trajectory(self, stepCnt, deltaT, xSpeed, ySpeed) :
+        """
+        The (dFrames, dxs, dys) increments of *stepCnt* steps
+        of the tracks with initial speeds *xSpeed* and *ySpeed*.
+        """
+        velModify = self.accelTerm * deltaT
+        dVelx, dVely = np.random.uniform(-velModify, velModify,
+                                         (2,) + np.shape(xSpeed) + (stepCnt,))
+        # The speed changes apply after each step.
+        xSpeeds = (np.asarray(xSpeed)[..., np.newaxis] +
+                   np.cumsum(dVelx, axis=-1) - dVelx)
+        ySpeeds = (np.asarray(ySpeed)[..., np.newaxis] +
+                   np.cumsum(dVely, axis=-1) - dVely)
+
+        return (np.full(xSpeeds.shape, self.deltaFrame, dtype=int),
+                self.deltaFrame * deltaT * xSpeeds,
+                self.deltaFrame * deltaT * ySpeeds)
+
 _motion_register(ConstVel_Model, 'ConstVel_Model', dict(deltaFrame="integer",
                                                         velModify="float(min=0)"))
 
@@ -87,10 +129,11 @@ class ConstVel2_Model(MotionModel) :
         dx = self.deltaFrame * deltaT * xSpeed
         dy = self.deltaFrame * deltaT * ySpeed
 
+        size = _step_size(xSpeed)
         angleModify = self.angleTerm * deltaT
-        dAngle = np.random.uniform(-angleModify, angleModify)
+        dAngle = np.random.uniform(-angleModify, angleModify, size)
         spdModify = self.accelTerm * deltaT
-        dSpd = np.random.uniform(-spdModify, spdModify)
+        dSpd = np.random.uniform(-spdModify, spdModify, size)
 
         dVelx = dSpd * np.cos(dAngle)
         dVely = dSpd * np.sin(dAngle)
@@ -100,6 +143,27 @@ class ConstVel2_Model(MotionModel) :
 
         return self.deltaFrame, dx, dy, 0.0, 0.0
 
+    hasTrajectory = True
+
+    def trajectory(self, stepCnt, deltaT, xSpeed, ySpeed) :
+        """
+        The (dFrames, dxs, dys) increments of *stepCnt* steps
+        of the tracks with speeds *xSpeed* and *ySpeed*.
+        """
+        shape = np.shape(xSpeed) + (stepCnt,)
+        # One draw for both the direction and the speed perturbations
+        mods = np.array([self.angleTerm, self.accelTerm]) * deltaT
+        dAngle, dSpd = (np.random.uniform(-1.0, 1.0, (2,) + shape) *
+                        mods.reshape((2,) + (1,) * len(shape)))
+
+        stepScale = self.deltaFrame * deltaT
+        dxs = stepScale * (np.asarray(xSpeed)[..., np.newaxis] +
+                           dSpd * np.cos(dAngle))
+        dys = stepScale * (np.asarray(ySpeed)[..., np.newaxis] +
+                           dSpd * np.sin(dAngle))
+
+        return np.full(shape, self.deltaFrame, dtype=int), dxs, dys
+
 _motion_register(ConstVel2_Model, 'ConstVel2_Model',
                  dict(deltaFrame="integer",
                       angleModify="float(min=0, max=360)",
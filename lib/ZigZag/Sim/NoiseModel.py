@@ -1,7 +1,7 @@
 import numpy as np
 #import numpy.lib.recfunctions as nprf   # for .append_fields()
-from scipy.spatial import KDTree
-from ZigZag.TrackUtils import Tracks2Cells
+from scipy.spatial import cKDTree
+from ZigZag.TrackUtils import Tracks2Cells, GroupCells
 
 
 noise_modelList = {}
@@ -50,44 +50,69 @@ class FalseMerge(NoiseModel) :
         # False mergers in this algorithm is only done
         # between tracks.  False Alarms are not included.
         trackStrms = Tracks2Cells(tracks)
+        if len(trackStrms) == 0 :
+            return
 
-        frames = np.arange(trackStrms['frameNums'].min(),
-                              trackStrms['frameNums'].max() + 1)
+        # Group the storm cells by frame just once, and then
+        # go frame by frame to see which storms could be occluded.
+        frameCells = GroupCells(trackStrms, 'frameNums')[1]
 
-        # Go frame by frame to see which storms could be occluded.
-        for frameIndex in frames :
-            strmCells = trackStrms[trackStrms['frameNums'] == frameIndex]
+        # The lengths of the tracks as the points get removed
+        trackLens = np.array([len(aTrack) for aTrack in tracks])
+        removedCells = []
 
+        for strmCells in frameCells :
             # Don't bother if there are only one or no strmCells for this moment in time
             if len(strmCells) <= 1 :
                 continue
 
-            tree = KDTree(zip(strmCells['xLocs'], strmCells['yLocs']))
+            tree = cKDTree(np.column_stack((strmCells['xLocs'],
+                                            strmCells['yLocs'])))
+            candidatePairs = tree.query_pairs(self._false_merge_dist,
+                                              output_type='ndarray')
+            if len(candidatePairs) == 0 :
+                continue
+
+            # The pairs are visited in a random order, because which pairs
+            # get skipped below depends on which were merged before them.
+            # Then, have the PRNG decide for all of the pairs at once
+            # whether a false merger should occur.
+            candidatePairs = candidatePairs[np.random.permutation(
+                                                len(candidatePairs))]
+            strm1Cells = strmCells[candidatePairs[:, 0]]
+            strm2Cells = strmCells[candidatePairs[:, 1]]
+            doMerge = (np.random.uniform(0.1, 1.0, len(candidatePairs)) *
+                       np.hypot(strm1Cells['xLocs'] - strm2Cells['xLocs'],
+                                strm1Cells['yLocs'] - strm2Cells['yLocs'])
+                       / self._false_merge_dist < self._false_merge_prob)
 
-            candidatePairs = list(tree.query_pairs(self._false_merge_dist))
             pointsRemoved = set([])
-            for aPair in candidatePairs :
+            for aPair in candidatePairs[doMerge] :
                 if aPair[0] in pointsRemoved or aPair[1] in pointsRemoved :
                     # One of these points have already been removed, skip this pair
                     continue
 
-                strm1Cell = strmCells[aPair[0]]
-                strm2Cell = strmCells[aPair[1]]
-                strm1TrackID = strm1Cell['trackID']
-                strm2TrackID = strm2Cell['trackID']
-
-                if (len(tracks[strm1TrackID]) > 3
-                    and len(tracks[strm2TrackID]) > 2
-                    and (np.random.uniform(0.1, 1.0) *
-                         np.hypot(strm1Cell['xLocs'] - strm2Cell['xLocs'],
-                                  strm1Cell['yLocs'] - strm2Cell['yLocs'])
-                         / self._false_merge_dist < self._false_merge_prob)) :
-                    # If the tracks are long enough, and the PRNG determines that a false
-                    #   merger should occur, then add this point to the list and then
-                    #   rebuild the list of points for the track without the removed point.
+                strm1TrackID = strmCells['trackID'][aPair[0]]
+                strm2TrackID = strmCells['trackID'][aPair[1]]
+
+                if (trackLens[strm1TrackID] > 3
+                    and trackLens[strm2TrackID] > 2) :
+                    # If the tracks are long enough, then the point is
+                    #   removed from its track.
                     pointsRemoved.add(aPair[0])
-                    tracks[strm1TrackID] = tracks[strm1TrackID][strm1Cell['cornerIDs']
-                                                  != tracks[strm1TrackID]['cornerIDs']]
+                    trackLens[strm1TrackID] -= 1
+                    removedCells.append(strmCells[aPair[0]])
+
+        if len(removedCells) == 0 :
+            return
+
+        # Now take the removed points out of each of their tracks at once.
+        removedCells = np.array(removedCells, dtype=trackStrms.dtype)
+        for trackID, trackRemoved in zip(*GroupCells(removedCells,
+                                                     'trackID')) :
+            removedIDs = trackRemoved['cornerIDs']
+            tracks[trackID] = tracks[trackID][~np.in1d(
+                                      tracks[trackID]['cornerIDs'], removedIDs)]
 
 
 _noise_register(FalseMerge, 'FalseMerge', dict(false_merge_prob="float(min=0, max=1)",
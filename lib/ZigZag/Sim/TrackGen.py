@@ -19,6 +19,17 @@ class TrackGenerator(object) :
     def __call__(self, cornerID, trackCnt, simState, *makerParams) :
         theTracks = []
         theFAlarms = []
+
+        # Make all of the tracks at once, if the track maker can.
+        makeBatch = getattr(self._trackMaker, 'batch', None)
+        if makeBatch is not None :
+            for newTrack in makeBatch(cornerID, trackCnt, self._initModel,
+                                      self._motionModel, *makerParams) :
+                cornerID += len(newTrack)
+                theTracks.append(np.sort(newTrack, 0, order=['frameNums']))
+
+            return theTracks, theFAlarms, cornerID
+
         for index in range(trackCnt) :
             newTrack = self._trackMaker(cornerID, self._initModel,
                                         self._motionModel, *makerParams)
@@ -8,10 +8,32 @@ def _init_register(modelclass, name, argValidator) :
 
     init_modelList[name] = (modelclass, argValidator)
 
+# The initial states of tracks, as returned by InitModel.sample()
+init_state_dtype = [('frameNums', 'i4'), ('xLocs', 'f8'), ('yLocs', 'f8'),
+                    ('xSpeed', 'f8'), ('ySpeed', 'f8')]
+
+def _init_states(frameNums, xLocs, yLocs, speeds, headings) :
+    """
+    Pack the initial states of tracks into an array of init_state_dtype.
+    The *headings* are in radians.
+    """
+    states = np.empty(len(frameNums), dtype=init_state_dtype)
+    states['frameNums'] = frameNums
+    states['xLocs'] = xLocs
+    states['yLocs'] = yLocs
+    states['xSpeed'] = speeds * np.cos(headings)
+    states['ySpeed'] = speeds * np.sin(headings)
+    return states
+
 #############################
 #   Initialization Models
 #############################
 class InitModel(object) :
+    """
+    Calling an init model gives a (frameNum, x, y, xSpeed, ySpeed)
+    initial state for a track.  Its *sample(n)* gives the initial states
+    of *n* tracks at once, as an array of init_state_dtype.
+    """
     def __init__(self) :
         self._initFrame = None
         self._initXPos = None
@@ -24,6 +46,16 @@ class InitModel(object) :
                                  self._initSpeed * np.cos(self._initHeading),
                                  self._initSpeed * np.sin(self._initHeading))
 
+    def sample(self, n) :
+        """
+        The initial states of *n* tracks.  Subclasses draw them all
+        at once, but this will do for any init model.
+        """
+        states = np.empty(n, dtype=init_state_dtype)
+        for index in range(n) :
+            states[index] = tuple(float(val) for val in self())
+        return states
+
 
 class SplitInit(InitModel) :
     useInitState = False
@@ -60,6 +92,14 @@ class SplitInit(InitModel) :
     def __call__(self) :
         return InitModel.__call__(self)
 
+    def sample(self, n) :
+        """ *n* copies of the initial state set by :meth:`setsplit` """
+        return _init_states(np.repeat(self._initFrame, n),
+                            np.repeat(self._initXPos, n),
+                            np.repeat(self._initYPos, n),
+                            np.repeat(self._initSpeed, n),
+                            np.repeat(self._initHeading, n))
+
 _init_register(SplitInit, 'SplitInit', dict(speedOff="float(min=0.0)",
                                             headOff="float(min=-360.0, max=360.0)"))
 
@@ -110,6 +150,17 @@ class NormalInit(InitModel) :
 
         return InitModel.__call__(self)
 
+    def sample(self, n) :
+        return _init_states(np.random.randint(self.frameLims[0],
+                                              self.frameLims[1], size=n),
+                            self.xScale * np.random.randn(n) + self.xPos,
+                            self.yScale * np.random.randn(n) + self.yPos,
+                            np.random.uniform(self.speedLims[0],
+                                              self.speedLims[1], size=n),
+                            np.random.uniform(self.headingLims[0],
+                                              self.headingLims[1], size=n) *
+                            (np.pi / 180.0))
+
 _init_register(NormalInit, 'NormalInit', dict(frameLims="int_list(min=2, max=2)",
                                               xPos="float", yPos="float",
                                               xScale="float(min=0.0)", yScale="float(min=0.0)",
@@ -165,6 +216,19 @@ class UniformInit(InitModel) :
 
         return InitModel.__call__(self)
 
+    def sample(self, n) :
+        return _init_states(np.random.randint(self.frameLims[0],
+                                              self.frameLims[1], size=n),
+                            np.random.uniform(self.xPosLims[0],
+                                              self.xPosLims[1], size=n),
+                            np.random.uniform(self.yPosLims[0],
+                                              self.yPosLims[1], size=n),
+                            np.random.uniform(self.speedLims[0],
+                                              self.speedLims[1], size=n),
+                            np.random.uniform(self.headingLims[0],
+                                              self.headingLims[1], size=n) *
+                            (np.pi / 180.0))
+
 _init_register(UniformInit, 'UniformInit', dict(frameLims="int_list(min=2, max=2)",
                                                 xLims="float_list(min=2, max=2)",
                                                 yLims="float_list(min=2, max=2)",
@@ -260,6 +324,29 @@ class UniformEllipse(InitModel) :
 
         return InitModel.__call__(self)
 
+    def sample(self, n) :
+        frameNums = np.random.randint(self.frameLims[0], self.frameLims[1],
+                                      size=n)
+        speeds = np.random.uniform(self.speedLims[0], self.speedLims[1],
+                                   size=n)
+        headings = np.random.uniform(self.headingLims[0], self.headingLims[1],
+                                     size=n) * (np.pi / 180.0)
+        r = np.random.uniform(0.0, 1.0, size=n)
+        phi = np.random.uniform(0.0, 1.0, size=n) * 2.0 * np.pi
+
+        # Random points within a uniform circle (see __call__()),
+        # scaled to the ellipse and rotated.
+        coords = np.sqrt(r) * np.array([np.cos(phi), np.sin(phi)])
+        coords *= np.array([[self.a], [self.b]])
+        coords = np.dot(self.rotMatrix, coords)
+
+        # Translate the ellipse a distance depending on the time
+        offsetDist = self.offsetSpeed * (frameNums - self.frameLims[0])
+        coords[0] += self.xOffset + offsetDist * np.cos(self.offsetHeading)
+        coords[1] += self.yOffset + offsetDist * np.sin(self.offsetHeading)
+
+        return _init_states(frameNums, coords[0], coords[1], speeds, headings)
+
 _init_register(UniformEllipse, 'EllipseUni', dict(frameLims="int_list(min=2, max=2)",
                                               a="float", b="float",
                                               orient="float(min=-360.0, max=360.0)",
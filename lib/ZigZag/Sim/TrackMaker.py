@@ -1,4 +1,6 @@
+import numpy as np
 from numpy import random, nan
+from ZigZag.TrackUtils import track_dtype
 
 #############################
 #   Track Making
@@ -91,3 +93,97 @@ class TrackPoint(object) :
         # TODO: Maybe there is some way to get the noise-less version?
         return (self.xLoc, self.yLoc, self.strm_size, self.cornerID,
                 nan, nan, self.frameNum, 'M')
+
+
+def BatchTrackPoints(cornerID, initStates, useInitState, trackDeathProb,
+                     deltaT, motionModel, maxLen = 50) :
+    """
+    Make many simulated tracks at once, with the same statistical behavior
+    as iterating a :class:`TrackPoint` for each of them.
+
+    Rather than stepping one track at a time, the death events of all of
+    the tracks are drawn as one array, the motion model is stepped for
+    all of the tracks together, and the positions and frame numbers are
+    the cumulative sums of the steps.
+
+    Parameters
+    ----------
+    cornerID : int
+        Integer to use to begin incrementally ID-ing the points generated.
+        The points of each track are numbered consecutively, one track
+        after the other.
+
+    initStates : array of init_state_dtype
+        The initial state of each track, as returned by the *sample()*
+        of an init model.
+
+    useInitState : bool
+        Whether the initial state is the first point of each track
+        (see the *useInitState* attribute of the init models).
+
+    trackDeathProb : float between 0 and 1
+        The probability that a track will die at some particular iteration.
+        0.0 for eternal tracks, 1.0 for single points.
+
+    deltaT : float
+        The time step for each frame in the track.
+
+    motionModel : MotionModel
+        The motion model, which must accept arrays of speeds.
+        Its *trajectory()* is used if it has one.
+
+    maxLen : int
+        Maximum length of the tracks
+
+    Returns a list of the tracks.
+    """
+    trackCnt = len(initStates)
+    if trackCnt == 0 :
+        return []
+
+    initFrames = initStates['frameNums'].astype(int)
+    initX = initStates['xLocs']
+    initY = initStates['yLocs']
+    xSpeed = initStates['xSpeed']
+    ySpeed = initStates['ySpeed']
+
+    # Every track has at least one point.  After that, each point
+    # survives the death check with probability 1 - trackDeathProb,
+    # until one doesn't, or the track is maxLen points long.
+    extraCnt = max(maxLen - 1, 0)
+    survives = (random.uniform(0.0, 1.0, size=(trackCnt, extraCnt)) >
+                trackDeathProb)
+    trackLens = 1 + np.cumprod(survives, axis=1).sum(axis=1)
+
+    # The initial state is either the first point, or one step
+    # before the first point.
+    firstStep = 1 if useInitState else 0
+    dFrames = np.zeros((trackCnt, extraCnt + 1), dtype=int)
+    dxs = np.zeros((trackCnt, extraCnt + 1))
+    dys = np.zeros((trackCnt, extraCnt + 1))
+    if getattr(motionModel, 'hasTrajectory', False) :
+        (dFrames[:, firstStep:], dxs[:, firstStep:],
+         dys[:, firstStep:]) = motionModel.trajectory(extraCnt + 1 - firstStep,
+                                                      deltaT, xSpeed, ySpeed)
+    else :
+        for stepIndex in range(firstStep, extraCnt + 1) :
+            (dFrames[:, stepIndex], dxs[:, stepIndex], dys[:, stepIndex],
+             dVelx, dVely) = motionModel(deltaT, xSpeed, ySpeed)
+            xSpeed = xSpeed + dVelx
+            ySpeed = ySpeed + dVely
+
+    # Keep just the points of each track, in order.
+    keepers = np.arange(extraCnt + 1) < trackLens[:, np.newaxis]
+    cells = np.empty(trackLens.sum(), dtype=track_dtype)
+    cells['frameNums'] = (initFrames[:, np.newaxis] +
+                          np.cumsum(dFrames, axis=1))[keepers]
+    cells['xLocs'] = (initX[:, np.newaxis] + np.cumsum(dxs, axis=1))[keepers]
+    cells['yLocs'] = (initY[:, np.newaxis] + np.cumsum(dys, axis=1))[keepers]
+    # Just a stub for now...
+    cells['sizes'] = 0.
+    cells['cornerIDs'] = cornerID + np.arange(len(cells))
+    cells['st_xLocs'] = nan
+    cells['st_yLocs'] = nan
+    cells['types'] = 'M'
+
+    return np.split(cells, np.cumsum(trackLens)[:-1])
@@ -14,7 +14,22 @@ falarm_cols = {'xLocs': 0, 'yLocs': 1, 'frameNums': 2, 'cornerIDs': 3,
                # appended on with default values.
                'st_xLocs': -2, 'st_yLocs': -2, 'types': -1}
 
-def SaveTracks(simTrackFile, tracks, falarms=()) :
+# The binary track files are plain numpy .npz archives, which are really
+# just zip files.  Any file starting with this signature is taken to be a
+# binary track file, everything else is assumed to be the older text format.
+_binary_magic = b'PK\x03\x04'
+
+def SaveTracks(simTrackFile, tracks, falarms=(), binary=True) :
+    """
+    Save the *tracks* and *falarms* to *simTrackFile*.
+
+    By default, the binary columnar format is written (see
+    :func:`SaveTracksBinary`).  Set *binary* to False to write the
+    older text format instead.  :func:`ReadTracks` can load either.
+    """
+    if binary :
+        return SaveTracksBinary(simTrackFile, tracks, falarms)
+
     dataFile = open(simTrackFile, 'w')
 
     non_empty = [(len(trk) > 0) for trk in tracks]
@@ -39,7 +54,80 @@ def SaveTracks(simTrackFile, tracks, falarms=()) :
     dataFile.close()
 
 
+def SaveTracksBinary(simTrackFile, tracks, falarms=()) :
+    """
+    Save the *tracks* and *falarms* in a binary, columnar format.
+
+    Each field of :data:`TrackUtils.base_track_dtype` is stored as one
+    contiguous array holding the points of all of the tracks, followed
+    by all of the false alarms.  The 'trackOffsets' array marks where each
+    track (and then each false alarm) starts and ends within those arrays.
+    Just like the text format, empty tracks are not saved.
+    """
+    tracks = [trk for trk in tracks if len(trk) > 0]
+    segs = tracks + [falarm for falarm in falarms if len(falarm) > 0]
+
+    trackOffsets = np.zeros(len(segs) + 1, dtype=np.int64)
+    np.cumsum([len(seg) for seg in segs], out=trackOffsets[1:])
+
+    columns = {}
+    for name, typespec in TrackUtils.base_track_dtype :
+        columns[name] = (np.concatenate([seg[name] for seg in segs]).astype(typespec)
+                         if len(segs) > 0 else
+                         np.array([], dtype=typespec))
+
+    dataFile = open(simTrackFile, 'wb')
+    try :
+        np.savez(dataFile, trackOffsets=trackOffsets,
+                 trackCnt=np.array(len(tracks)), **columns)
+    finally :
+        dataFile.close()
+
+
+def ReadTracksBinary(fileName) :
+    """
+    Load the tracks and false alarms from a binary track file
+    written by :func:`SaveTracksBinary`.
+
+    The points are loaded into a single backing array, and the returned
+    tracks and false alarms are views into that array.
+    """
+    data = np.load(fileName)
+    try :
+        trackOffsets = data['trackOffsets']
+        trackCnt = int(data['trackCnt'])
+
+        allCells = np.empty(trackOffsets[-1], dtype=TrackUtils.base_track_dtype)
+        for name, typespec in TrackUtils.base_track_dtype :
+            allCells[name] = data[name]
+    finally :
+        data.close()
+
+    segs = [allCells[start:stop] for start, stop in
+            zip(trackOffsets[:-1], trackOffsets[1:])]
+
+    return segs[:trackCnt], segs[trackCnt:]
+
+
+def IsBinaryTrackFile(fileName) :
+    """
+    Determine whether *fileName* is a binary track file (as opposed to
+    the older text format).
+    """
+    with open(fileName, 'rb') as dataFile :
+        return dataFile.read(len(_binary_magic)) == _binary_magic
+
+
 def ReadTracks(fileName) :
+    """
+    Load the tracks and false alarms from *fileName*.
+
+    Both the binary format and the older text format are supported,
+    and the format is detected automatically.
+    """
+    if IsBinaryTrackFile(fileName) :
+        return ReadTracksBinary(fileName)
+
     contourCnt = None
     falseAlarmCnt = None
 
@@ -121,6 +209,9 @@ def SaveCorners(inputDataFile, corner_filestem, volume_data, path='.') :
     Corner files comprise of a set of data files, and one control file.
     The control file contains the filestem of the data files, the number of
     data files, and the number of storm cells in each data file.
+
+    A packed copy of all of the corner data is also saved
+    (see :func:`SavePackedCorners`) for faster loading by :func:`ReadCorners`.
     """
     if len(volume_data) > 0:
         startFrame = volume_data[0]['frameNum']
@@ -137,17 +228,113 @@ def SaveCorners(inputDataFile, corner_filestem, volume_data, path='.') :
 
     # FIXME: Make this more robust and future-proof with respect
     # to texture data.
+    frameCells = []
     for volIndex, aVol in enumerate(volume_data) :
         outFile = open("%s.%d" % (os.path.join(path, corner_filestem), startFrame + volIndex), 'w')
-        for strmCell in aVol['stormCells'] :
-            outFile.write(("%(xLocs).10f %(yLocs).10f %(sizes).2f " % (strmCell))
-                          + ' '.join(['0'] * 24) + ' '
+        cells = np.empty(len(aVol['stormCells']), dtype=TrackUtils.corner_dtype)
+        for cellIndex, strmCell in enumerate(aVol['stormCells']) :
+            cellStr = "%(xLocs).10f %(yLocs).10f %(sizes).2f" % (strmCell)
+            outFile.write(cellStr + ' ' + ' '.join(['0'] * 24) + ' '
                           + str(strmCell['cornerIDs']) + '\n')
+            # The packed copy holds exactly what would be read back
+            # from the text file.
+            cells[cellIndex] = tuple([float(val) for val in cellStr.split()] +
+                                     [strmCell['cornerIDs']])
         outFile.close()
+        frameCells.append(cells)
         dataFile.write(str(len(aVol['stormCells'])) + '\n')
 
     dataFile.close()
 
+    # The packed file is written last so that it is never older than the
+    # control file.  Otherwise, ReadCorners() will consider it to be stale.
+    SavePackedCorners(_packed_filename(corner_filestem, path), frameCells)
+
+
+# Signature for the packed corner file.  The signature is followed by
+# the frame count (int64), the frame-offset table (frame count + 1 int64s)
+# and then by all of the storm cells of each frame, back-to-back.
+_packed_magic = b'ZZCORNR1'
+
+def _packed_filename(corner_filestem, path='.') :
+    return "%s.pack" % os.path.join(path, corner_filestem)
+
+def _packed_is_current(packFile, sourceFiles) :
+    """
+    Whether the packed corner file *packFile* can be used in place of
+    the *sourceFiles* (the control file and the corner files).
+    It can be, if it is at least as new as all of them.  Any of the
+    source files that do not exist are ignored.
+    """
+    try :
+        packTime = os.stat(packFile).st_mtime
+    except OSError :
+        return False
+
+    for sourceFile in sourceFiles :
+        try :
+            if os.stat(sourceFile).st_mtime > packTime :
+                return False
+        except OSError :
+            pass
+
+    return True
+
+def SavePackedCorners(packFile, frameCells) :
+    """
+    Save the storm cells for all of the frames in *frameCells*
+    (a list of arrays, one per frame) into the single file *packFile*.
+    """
+    cornerType = np.dtype(TrackUtils.corner_dtype)
+    frameOffsets = np.zeros(len(frameCells) + 1, dtype='<i8')
+    frameOffsets[1:] = np.cumsum([len(cells) for cells in frameCells])
+
+    dataFile = open(packFile, 'wb')
+    try :
+        dataFile.write(_packed_magic)
+        np.array([len(frameCells)], dtype='<i8').tofile(dataFile)
+        frameOffsets.tofile(dataFile)
+        for cells in frameCells :
+            packed = np.empty(len(cells), dtype=cornerType)
+            for name in cornerType.names :
+                packed[name] = cells[name]
+            packed.tofile(dataFile)
+    finally :
+        dataFile.close()
+
+def ReadPackedCorners(packFile) :
+    """
+    Memory-map the storm cells saved by :func:`SavePackedCorners`.
+
+    Returns a list of arrays (one per frame) that are views into the
+    memory-mapped file.  The map is copy-on-write, so modifying the
+    storm cells will not modify the file.
+    """
+    cornerType = np.dtype(TrackUtils.corner_dtype)
+    dataFile = open(packFile, 'rb')
+    try :
+        if dataFile.read(len(_packed_magic)) != _packed_magic :
+            raise ValueError("%s is not a packed corner file" % packFile)
+
+        frameCnt = int(np.fromfile(dataFile, dtype='<i8', count=1)[0])
+        frameOffsets = np.fromfile(dataFile, dtype='<i8', count=frameCnt + 1)
+    finally :
+        dataFile.close()
+
+    if len(frameOffsets) != frameCnt + 1 :
+        raise ValueError("%s is truncated" % packFile)
+
+    if frameOffsets[-1] > 0 :
+        allCells = np.memmap(packFile, dtype=cornerType, mode='c',
+                             offset=len(_packed_magic) + 8 * (frameCnt + 2),
+                             shape=(int(frameOffsets[-1]),))
+    else :
+        # Can't memory-map an empty region of a file.
+        allCells = np.array([], dtype=cornerType)
+
+    return [allCells[start:stop] for start, stop in
+            zip(frameOffsets[:-1], frameOffsets[1:])]
+
 
 def _loadtxtfile(filename, loadkwargs, arraykwargs) :
     """
@@ -184,6 +371,11 @@ def ReadCorners(inputDataFile, path='.') :
 
     inputDataFile is the filename of the 'control file' that contains
     all the info needed to load the corner data files.
+
+    The packed copy of the corner data (see :func:`SaveCorners`) is used
+    instead of the corner data files, but only if it is at least as new
+    as the control file and all of the corner data files, and only if
+    it can be read.
     """
     dataFile = open(inputDataFile, 'r')
     headerList = dataFile.readline().split()
@@ -203,13 +395,34 @@ def ReadCorners(inputDataFile, path='.') :
     frames = np.arange(startFrame, startFrame + frameCnt)
     volTimes = np.linspace(0.0, (frameCnt - 1)*timeDelta, num=frameCnt)
 
+    cornerFiles = ["%s.%d" % (os.path.join(path, corner_filestem), frameNum)
+                   for frameNum in frames]
+
+    frameCells = None
+    packFile = _packed_filename(corner_filestem, path)
+    if _packed_is_current(packFile, [inputDataFile] + cornerFiles) :
+        try :
+            frameCells = ReadPackedCorners(packFile)
+        except ValueError as err :
+            print("WARNING: Could not read %s: %s" % (packFile, err))
+        else :
+            if len(frameCells) != frameCnt :
+                print("WARNING: Frame count mismatch between %s and %s" %
+                      (inputDataFile, packFile))
+                frameCells = None
+
+    if frameCells is None :
+        frameCells = [_loadtxtfile(cornerFile,
+                                   dict(usecols=[corner_cols[colname] for colname, typecode in
+                                        TrackUtils.corner_dtype]),
+                                   dict(dtype=TrackUtils.corner_dtype))
+                      for cornerFile in cornerFiles]
+
     volume_data = [{'volTime': volTime,
                     'frameNum': frameNum,
-                    'stormCells': _loadtxtfile("%s.%d" % (os.path.join(path, corner_filestem), frameNum),
-                                               dict(usecols=[corner_cols[colname] for colname, typecode in
-                                                    TrackUtils.corner_dtype]),
-                                               dict(dtype=TrackUtils.corner_dtype))}
-                   for volTime, frameNum in zip(volTimes, frames)]
+                    'stormCells': stormCells}
+                   for volTime, frameNum, stormCells in zip(volTimes, frames,
+                                                            frameCells)]
 #    print("volume_data:", len(volume_data), " voltimes:", len(volTimes), " frames:", len(frames))
     return {'corner_filestem': corner_filestem, 'frameCnt': frameCnt, 'volume_data': volume_data}
 
@@ -136,7 +136,7 @@ def _new_polygon(verts, ax=None) :
 
 def _load_verts(pickfile, trks):
     from cPickle import load
-    from ZigZag.TrackUtils import Tracks2Cells
+    from ZigZag.TrackUtils import Tracks2Cells, GroupCells
     with open(pickfile, 'rb') as pck:
         polygons = load(pck)
 
@@ -145,8 +145,9 @@ def _load_verts(pickfile, trks):
     minframe = min(cells['frameNums'].min(), 0)
 
     polyverts = []
-    for f in xrange(minframe, maxframe + 1):
-        cells_in_frame = cells[cells['frameNums'] == f]
+    frameCells = GroupCells(cells, 'frameNums',
+                            np.arange(minframe, maxframe + 1))[1]
+    for cells_in_frame in frameCells:
         polys = [polygons[cID] for cID in cells_in_frame['cornerIDs'] if
                  cID in polygons]
         polyverts.append(polys)
@@ -35,6 +35,26 @@ base_track_dtype = pos_dtype + cornerID_dtype + tracking_dtype
 track_dtype = corner_dtype + tracking_dtype
 volume_dtype = track_dtype + identifier_dtype
 
+def Corners2Cells(corners, frameNum) :
+    """
+    Make an array of storm cells (of volume_dtype) from the *corners*
+    of frame *frameNum*, ready for tracking.  The state-estimated
+    locations are NaN, the types are 'U' and the track IDs are -1.
+
+    The *corners* are not modified.
+    """
+    cells = np.empty(len(corners), dtype=volume_dtype)
+    for name in corners.dtype.names :
+        if name in cells.dtype.names :
+            cells[name] = corners[name]
+
+    cells['st_xLocs'] = np.nan
+    cells['st_yLocs'] = np.nan
+    cells['frameNums'] = frameNum
+    cells['types'] = 'U'
+    cells['trackID'] = -1
+    return cells
+
 def Tracks2Cells(tracks, falarms=None) :
     """
     Convert lists of tracks (and falarms) into a single recarray of storm cells
@@ -68,22 +88,52 @@ def Tracks2Cells(tracks, falarms=None) :
     return allCells
 
 
+def GroupCells(cells, field, keys=None) :
+    """
+    Group the storm *cells* by the value of their *field* (such as
+    'frameNums' or 'trackID'), with just one sort of the cells.
+
+    *keys* are the values of *field* to get the groups for, in that order.
+    By default, it is every value that occurs, in sorted order.
+
+    Returns the *keys* and a list of the groups of cells for those keys.
+    The groups are views into one sorted copy of *cells*, and the cells
+    in each group are in the same order as they are in *cells*.  A key
+    that has no cells gets an empty group.
+    """
+    sortedCells = cells[np.argsort(cells[field], kind='mergesort')]
+    sortedKeys = sortedCells[field]
+    if keys is None :
+        keys = np.unique(sortedKeys)
+    keys = np.asarray(keys)
+
+    starts = np.searchsorted(sortedKeys, keys, side='left')
+    stops = np.searchsorted(sortedKeys, keys, side='right')
+    return keys, [sortedCells[start:stop] for start, stop in
+                  zip(starts, stops)]
+
 def Cells2Tracks(strmCells) :
     """
     Convert a numpy recarray of dtype track_dtype into two lists
     of tracks and falarms.
 
     This can be reversed with Tracks2Cells().
-    """
-    trackIDs = np.unique(strmCells['trackID'][strmCells['trackID'] >= 0])
-    tracks = [np.sort(strmCells[strmCells['trackID'] == id], 0, order=['frameNums'])
-                for id in trackIDs]
 
-    falarmIDs = np.unique(strmCells['trackID'][strmCells['trackID'] < 0])    
-    falarms = [np.sort(strmCells[strmCells['trackID'] == id], 0, order=['frameNums'])
-                for id in falarmIDs]
-
-    return tracks, falarms
+    The tracks and the falarms are each in order of their track IDs,
+    and the storm cells of each are in order of their frames.
+    """
+    # One sort by track ID, then by frame, and then split
+    # wherever the track ID changes.
+    strmCells = strmCells[np.lexsort((strmCells['frameNums'],
+                                      strmCells['trackID']))]
+    trackIDs = strmCells['trackID']
+    bounds = np.flatnonzero(np.diff(trackIDs)) + 1
+    groups = np.split(strmCells, bounds) if len(strmCells) > 0 else []
+
+    # Negative track IDs (the falarms) all sort before the tracks.
+    falarmCnt = np.searchsorted(trackIDs[np.r_[0, bounds]], 0) if \
+                len(groups) > 0 else 0
+    return groups[falarmCnt:], groups[:falarmCnt]
     
 
 def CreateVolData(tracks, falarms, frames, tLims=None, xLims=None, yLims=None) :
@@ -121,12 +171,13 @@ def Cells2VolData(allCells, frames, tLims=None, xLims=None, yLims=None) :
     times = frames if tLims is None else \
             np.linspace(min(tLims), max(tLims), len(frames))
 
-    for volTime, frameIndex in zip(times, frames) :
-        # Again, this mask is opposite from numpy masked array.
-        tMask = (allCells['frameNums'] == frameIndex)
+    domainCells = allCells[domainMask] if domainMask is not True else allCells
+    frameCells = GroupCells(domainCells, 'frameNums', frames)[1]
+
+    for volTime, frameIndex, strmCells in zip(times, frames, frameCells) :
         volData.append({'volTime': volTime,
                         'frameNum': frameIndex,
-                        'stormCells': allCells[domainMask & tMask]})
+                        'stormCells': strmCells.copy()})
 
     return volData
 
@@ -217,11 +268,29 @@ def CleanupTracks(tracks, falarms) :
             del falarms[trackIndex]
 
 
+def KeeperMask(cornerIDs, idKeepers) :
+    """
+    Boolean mask of which of the *cornerIDs* are in *idKeepers*, which can
+    be a set or a sorted array of the unique cornerIDs to keep (such as
+    from :func:`ZigZag.ParamUtils.ReadKeeperIDs`).
+    """
+    if not isinstance(idKeepers, np.ndarray) :
+        idKeepers = np.array(sorted(idKeepers), dtype=int)
+
+    cornerIDs = np.asarray(cornerIDs)
+    if len(idKeepers) == 0 :
+        return np.zeros(cornerIDs.shape, dtype=bool)
+
+    pos = np.searchsorted(idKeepers, cornerIDs)
+    pos[pos == len(idKeepers)] = 0
+    return idKeepers[pos] == cornerIDs
+
 def FilterSegments(idKeepers, segs) :
     """
-    Filter a list of segments based on the cornerID value of the segment's
+    Filter a list of segments (or a segment table, see
+    :func:`CreateSegmentTable`) based on the cornerID value of the segment's
     start point. *idKeepers* contains the cornerID values that are to be
-    kept.  If it is None, no filtering is done.
+    kept (see :func:`KeeperMask`).  If it is None, no filtering is done.
 
     *others* are additional lists that may be parallel to *segs* and should
     be filtered as well based on the results of comparison to *segs*. This
@@ -232,11 +301,80 @@ def FilterSegments(idKeepers, segs) :
         return segs
 #        return segs, *others
 
+    if _is_segment_table(segs) :
+        return segs[KeeperMask(segs['start']['cornerIDs'], idKeepers)]
+
+    if isinstance(idKeepers, np.ndarray) :
+        idKeepers = set(idKeepers.tolist())
+
     segs = [aSeg for aSeg in segs if aSeg[0]['cornerIDs'] in idKeepers]
 
     return segs
 
 
+def segment_dtype(cellDtype) :
+    """
+    The dtype of a segment table (see :func:`CreateSegmentTable`)
+    for storm cells of dtype *cellDtype*.
+    """
+    return [('start', cellDtype), ('end', cellDtype),
+            ('trackIndex', 'i4'), ('isAssoc', '?')]
+
+def _is_segment_table(segs) :
+    return (isinstance(segs, np.ndarray) and segs.dtype.names is not None and
+            'start' in segs.dtype.names)
+
+def CreateSegmentTable(tracks, lastFrame=None) :
+    """
+    Breaks up a list of the tracks (or falarms) into a segment table.
+
+    The segment table is a single structured array (see
+    :func:`segment_dtype`) with one row per segment, in the same order as
+    the segments from :func:`CreateSegments`.  The 'start' and 'end'
+    fields are the start and end points of the segment, 'trackIndex'
+    is the index of the track the segment came from, and 'isAssoc'
+    is False for the one-point segment at the end of each track.
+    The end point of a one-point segment is the start point.
+
+    If you want to impose a finite timeline, and therefore, exclude
+    any segments that start on or after *lastFrame*.
+    """
+    trackLens = np.array([len(aTrack) for aTrack in tracks], dtype=int)
+    cellCnt = trackLens.sum()
+    if cellCnt == 0 :
+        cellDtype = tracks[0].dtype if len(tracks) > 0 else base_track_dtype
+        return np.empty(0, dtype=segment_dtype(cellDtype))
+
+    cells = np.concatenate([aTrack for aTrack in tracks if len(aTrack) > 0])
+
+    # Every storm cell starts one segment.  The last storm cell of
+    # a track has a one-point segment, and the others end at the
+    # next storm cell.
+    isLast = np.zeros(cellCnt, dtype=bool)
+    isLast[np.cumsum(trackLens[trackLens > 0]) - 1] = True
+
+    segTable = np.empty(cellCnt, dtype=segment_dtype(cells.dtype))
+    segTable['start'] = cells
+    segTable['end'] = cells[np.arange(cellCnt) + ~isLast]
+    segTable['trackIndex'] = np.repeat(np.arange(len(tracks)), trackLens)
+    segTable['isAssoc'] = ~isLast
+
+    if lastFrame is not None :
+        segTable = segTable[cells['frameNums'] < lastFrame]
+
+    return segTable
+
+def SegmentTable2Segments(segTable) :
+    """
+    Convert a segment table (see :func:`CreateSegmentTable`) into the
+    list of segments that :func:`CreateSegments` would make.
+    """
+    points = np.empty((len(segTable), 2), dtype=segTable.dtype['start'])
+    points[:, 0] = segTable['start']
+    points[:, 1] = segTable['end']
+    return [(aSeg if isAssoc else aSeg[:1]) for aSeg, isAssoc in
+            zip(points, segTable['isAssoc'])]
+
 def CreateSegments(tracks, retindices=False, lastFrame=None) :
     """
     Breaks up a list of the tracks (or falarms) into an array of segments.
@@ -244,24 +382,15 @@ def CreateSegments(tracks, retindices=False, lastFrame=None) :
 
     If you want to impose a finite timeline, and therefore, exclude
     any segments that start on or after *lastFrame*.
+
+    This is a list-of-arrays view of :func:`CreateSegmentTable`, which
+    should be preferred for large numbers of tracks.
     """
-    segs = []
-    indices = []
-    for trackID, aTrack in enumerate(tracks) :
-        if len(aTrack) > 1 :
-            tmpSegs = [np.hstack(aSeg) for aSeg in zip(aTrack[:-1],
-                                                       aTrack[1:]) if
-                       (lastFrame is None or
-                        aSeg[0]['frameNums'] < lastFrame)]
-            segs.extend(tmpSegs)
-            indices.extend([trackID] * len(tmpSegs))
-
-        if lastFrame is None or aTrack[-1]['frameNums'] < lastFrame :
-            segs.append(aTrack[-1:])
-            indices.append(trackID)
+    segTable = CreateSegmentTable(tracks, lastFrame=lastFrame)
+    segs = SegmentTable2Segments(segTable)
 
     if retindices :
-        return segs, indices
+        return segs, segTable['trackIndex'].tolist()
     else :
         return segs
 
@@ -345,6 +474,73 @@ def MakeTruthTable(realSegs, realFAlarmSegs, predSegs, predFAlarmSegs) :
             'correct_indices': assocs_Correct_indices + falarms_Correct_indices,
             'wrong_indices': assocs_Wrong_indices + falarms_Wrong_indices}
 
+def SegmentIDs(segs) :
+    """
+    Represent a list of segments (from :func:`CreateSegments`) as
+    parallel arrays of the cornerIDs of the start and end points of
+    the segments and whether the segment is an association (two points)
+    or not (one point).  The end point of a one-point segment is
+    the start point.
+
+    A segment table (see :func:`CreateSegmentTable`) may be given instead.
+
+    Returns *startIDs*, *endIDs*, *isAssoc*
+    """
+    if _is_segment_table(segs) :
+        return (segs['start']['cornerIDs'].astype(int),
+                segs['end']['cornerIDs'].astype(int),
+                segs['isAssoc'].copy())
+
+    startIDs = np.array([aSeg['cornerIDs'][0] for aSeg in segs], dtype=int)
+    endIDs = np.array([aSeg['cornerIDs'][-1] for aSeg in segs], dtype=int)
+    isAssoc = np.array([len(aSeg) == 2 for aSeg in segs], dtype=bool)
+    return startIDs, endIDs, isAssoc
+
+def MakeContingencyArrays(obvIDs, trkIDs) :
+    """
+    Array-based engine for :func:`MakeContingency`.
+
+    *obvIDs* and *trkIDs* are the (*startIDs*, *endIDs*, *isAssoc*)
+    arrays (see :func:`SegmentIDs`) of the observed segments and of the
+    tracking segments, respectively.
+
+    Returns the same dictionary as :func:`MakeContingency`, except that
+    each category holds an array of indices into the observed segments
+    rather than the segments themselves.  The len() of each category
+    is still its count in the contingency table.
+    """
+    obvStarts, obvEnds, obvAssoc = obvIDs
+    trkStarts, trkEnds = trkIDs[0], trkIDs[1]
+
+    if len(obvStarts) != len(trkStarts) :
+        print("WARNING: Segment count mismatch: " \
+              "%d vs. %d" % (len(obvStarts), len(trkStarts)))
+
+    # Find the tracking segment that has the same cornerID for the
+    # first part of the segment as each observed segment.  A stable
+    # sort and a right-side search means that the last of any tracking
+    # segments with the same starting cornerID is the one that is used.
+    order = np.argsort(trkStarts, kind='mergesort')
+    sortedStarts = trkStarts[order]
+    pos = np.searchsorted(sortedStarts, obvStarts, side='right') - 1
+    found = (pos >= 0)
+    found[found] = (sortedStarts[pos[found]] == obvStarts[found])
+    if not np.all(found) :
+        raise KeyError(obvStarts[~found][0])
+    trksegIDs = order[pos]
+
+    # Then compare the cornerID of the last part of the observed segment
+    # with the last part of the tracking segment.  See the notes in
+    # MakeContingency() for why this is sufficient.
+    isCorrect = (obvEnds == trkEnds[trksegIDs])
+
+    return {'assocs_Correct': np.flatnonzero(obvAssoc & isCorrect),
+            'assocs_Wrong': np.flatnonzero(obvAssoc & ~isCorrect),
+            'falarms_Wrong': np.flatnonzero(~obvAssoc & ~isCorrect),
+            'falarms_Correct': np.flatnonzero(~obvAssoc & isCorrect),
+            'assocs_should': trksegIDs[obvAssoc & ~isCorrect],
+            'falarms_should': trksegIDs[~obvAssoc & ~isCorrect]}
+
 def MakeContingency(obvSegs, trkSegs) :
     """
     Revamped version of :func:`MakeTruthTable`.  I am not willing
@@ -354,33 +550,20 @@ def MakeContingency(obvSegs, trkSegs) :
     This method will be a mathematically, margin-sum correct
     method of creating a contingency table, however it is not
     useful for producing track plots.
-    """
-    if len(obvSegs) != len(trkSegs) :
-        print("WARNING: Segment count mismatch: " \
-              "%d vs. %d" % (len(obvSegs), len(trkSegs)))
-
-    # Create a dictionary to map the cornerID for the first
-    # part of each tracking segment to the index number
-    # in the trkSegs list.
-    mapper = {}
-    for i, aSeg in enumerate(trkSegs) :
-        mapper[aSeg['cornerIDs'][0]] = i
 
-    # Dictionaries mapped to tuples of bools: (isAssoc, isCorrect)
+    The work is done by :func:`MakeContingencyArrays`.  Use that
+    directly if the segments themselves are not needed.
+    """
+    # Tuples of bools: (isAssoc, isCorrect)
     # (True, True) == Correct Association
     # (True, False) == Incorrect Association
     # (False, True) == Correct Non-Association
     # (False, False) == Incorrect Non-Association
-    segs = {(True, True) : [], (True, False) : [],
-            (False, True): [], (False, False): []}
-    seg_indices = {(True, True) : [], (True, False) : [],
-                   (False, True): [], (False, False): []}
-
-    # Now, go through each observed segments, seeking out
-    # the trkSeg that has the same cornerID for the first
-    # part of the segment as the obvserved segment.
-    # Then compare the cornerID of the last part of the
-    # observed segment with the last part of the tracking
+    #
+    # For each observed segment, the trkSeg that has the same cornerID
+    # for the first part of the segment as the obvserved segment
+    # is sought out.  Then the cornerID of the last part of the
+    # observed segment is compared with the last part of the tracking
     # segment.
     # Note that I am not saying to match against the second
     # part, because some segments can be of length one.
@@ -393,22 +576,16 @@ def MakeContingency(obvSegs, trkSegs) :
     # ids for a segment are never the same, and the
     # corner id for the first part already matched the
     # corner id of the short segment.
-    for i, aSeg in enumerate(obvSegs) :
-        is_assoc = (len(aSeg) == 2)
-        obv_corners = aSeg['cornerIDs']
-        trkseg_id = mapper[obv_corners[0]]
-        trk_corners = trkSegs[trkseg_id]['cornerIDs']
-        is_correct = (obv_corners[-1] == trk_corners[-1])
-
-        segs[(is_assoc, is_correct)].append(aSeg)
-        seg_indices[(is_assoc, is_correct)].append(trkseg_id)
-
-    return {'assocs_Correct': segs[(True, True)],
-            'assocs_Wrong': segs[(True, False)],
-            'falarms_Wrong': segs[(False, False)],
-            'falarms_Correct': segs[(False, True)],
-            'assocs_should': seg_indices[(True, False)],
-            'falarms_should': seg_indices[(False, False)]}
+    table = MakeContingencyArrays(SegmentIDs(obvSegs), SegmentIDs(trkSegs))
+
+    for category in ('assocs_Correct', 'assocs_Wrong',
+                     'falarms_Wrong', 'falarms_Correct') :
+        table[category] = [obvSegs[i] for i in table[category]]
+
+    for category in ('assocs_should', 'falarms_should') :
+        table[category] = table[category].tolist()
+
+    return table
    
 
 def _compare_segs(realSegs, predSegs) :
@@ -1,10 +1,12 @@
 
 import ZigZag.TrackFileUtils as TrackFileUtils
 import ZigZag.TrackUtils as TrackUtils
+from ZigZag.Trackers.trackstore import TrackStore
 import os.path
 import tempfile
 import os
 import numpy as np
+import multiprocessing
 
 
 trackerList = {}
@@ -19,6 +21,29 @@ def _register_tracker(tracker, name, param_conf) :
     
 
 # Some standard utility functions that would be typically used here...
+def _load_corners(simParams, dirName, cornerInfo=None) :
+    """
+    Return the already-loaded *cornerInfo* (as from
+    :func:`TrackFileUtils.ReadCorners`), or read it from the
+    simulation in *dirName* if it was not given.
+    """
+    if cornerInfo is None :
+        cornerInfo = TrackFileUtils.ReadCorners(os.path.join(dirName,
+                                                    simParams['inputDataFile']),
+                                                path=dirName)
+    return cornerInfo
+
+def _make_pool(trackParams) :
+    """
+    Make a pool of processes if the track run asked for more than one
+    process.  Returns None otherwise, or if this is already a worker
+    process of another pool (which can not have children).
+    """
+    processes = int(trackParams.get('processes', 0))
+    if processes > 1 and not multiprocessing.current_process().daemon :
+        return multiprocessing.Pool(processes)
+    return None
+
 def _load_times(simParams, volumes) :
     """ Assumes that len(volumes) > 1 """
     times = simParams['times']
@@ -42,11 +67,10 @@ def _load_times(simParams, volumes) :
 
 def track_wrap(f) :
     def perform_tracking(trackRun, simParams,
-                         trackParams, returnResults=True, path='.') :
+                         trackParams, returnResults=True, path='.',
+                         cornerInfo=None) :
         dirName = path
-        cornerInfo = TrackFileUtils.ReadCorners(os.path.join(dirName,
-                                                    simParams['inputDataFile']),
-                                                path=dirName)
+        cornerInfo = _load_corners(simParams, dirName, cornerInfo)
 
     if len(cornerInfo['volume_data']) <= 1 :
         raise Exception("Not enough frames for tracking: %d" %
@@ -65,12 +89,11 @@ def track_wrap(f) :
         return tracks, falarms
 
 
-def SCIT_Track(trackRun, simParams, trackParams, returnResults=True, path='.') :
+def SCIT_Track(trackRun, simParams, trackParams, returnResults=True, path='.',
+               cornerInfo=None) :
 
     dirName = path
-    cornerInfo = TrackFileUtils.ReadCorners(os.path.join(dirName,
-                                                 simParams['inputDataFile']),
-                                            path=dirName)
+    cornerInfo = _load_corners(simParams, dirName, cornerInfo)
     if simParams['frameCnt'] <= 1 :
         raise Exception("Not enough frames for tracking: %d" %
                          simParams['frameCnt'])
@@ -85,7 +108,7 @@ def SCIT_Track(trackRun, simParams, trackParams, returnResults=True, path='.') :
     default_spd = float(trackParams['default_spd'])
 
     stateHist = []
-    strmTracks = []
+    strmTracks = TrackStore()
     infoTracks = []
 
     strmAdap = {'spdThresh': speedThresh,
@@ -104,6 +127,7 @@ def SCIT_Track(trackRun, simParams, trackParams, returnResults=True, path='.') :
                             tDelta, frameOffset)
 
     scit.EndTracks(stateHist, strmTracks)
+    strmTracks = strmTracks.tolist()
 
     falarms = []
     TrackUtils.CleanupTracks(strmTracks, falarms)
@@ -120,7 +144,10 @@ _register_tracker(SCIT_Track, "SCIT",
                        default_dir="float(min=-360.0, max=360.0, default=0.0)",
                        default_spd="float(min=0.0, default=0.0)"))
 
-def MHT_Track(trackRun, simParams, trackParams, returnResults=True, path='.') :
+def MHT_Track(trackRun, simParams, trackParams, returnResults=True, path='.',
+              cornerInfo=None) :
+    # NOTE: cornerInfo is not used because the MHT program reads
+    #       the corner files itself.
     import mht
     progDir = "~/Programs/mht_tracking/tracking/"
     dirName = path
@@ -171,12 +198,10 @@ _register_tracker(MHT_Track, "MHT",
                        ParamFile="string(default='Parameters')"))
 
 def TITAN_Track(trackRun, simParams, trackParams,
-                returnResults=True, path='.') :
+                returnResults=True, path='.', cornerInfo=None) :
     import titan
     dirName = path
-    cornerInfo = TrackFileUtils.ReadCorners(os.path.join(dirName,
-                                                    simParams['inputDataFile']),
-                                            path=dirName)
+    cornerInfo = _load_corners(simParams, dirName, cornerInfo)
     speedThresh = float(trackParams['speedThresh'])
 
     if simParams['frameCnt'] <= 1 :
@@ -185,13 +210,19 @@ def TITAN_Track(trackRun, simParams, trackParams,
 
     lasttime = _load_times(simParams, cornerInfo['volume_data'])
 
-    t = titan.TITAN()
-    for aVol in cornerInfo['volume_data'] :
-        currtime = aVol['volTime']
-        tDelta = currtime - lasttime
-        t.distThresh = speedThresh * tDelta
-        t.TrackStep(aVol)
-        lasttime = currtime
+    pool = _make_pool(trackParams)
+    try :
+        t = titan.TITAN(pool=pool)
+        for aVol in cornerInfo['volume_data'] :
+            currtime = aVol['volTime']
+            tDelta = currtime - lasttime
+            t.distThresh = speedThresh * tDelta
+            t.TrackStep(aVol)
+            lasttime = currtime
+    finally :
+        if pool is not None :
+            pool.close()
+            pool.join()
 
     # Tidy up tracks because there won't be any more data
     t.finalize()
@@ -206,15 +237,15 @@ def TITAN_Track(trackRun, simParams, trackParams,
     if returnResults :
         return tracks, falarms
 
-_register_tracker(TITAN_Track, "TITAN", dict(speedThresh="float(min=0.0)"))
+_register_tracker(TITAN_Track, "TITAN",
+                  dict(speedThresh="float(min=0.0)",
+                       processes="integer(min=0, default=0)"))
 
 def ASCIT_Track(trackRun, simParams, trackParams,
-                returnResults=True, path='.') :
+                returnResults=True, path='.', cornerInfo=None) :
     import ascit
     dirName = path
-    cornerInfo = TrackFileUtils.ReadCorners(os.path.join(dirName,
-                                                    simParams['inputDataFile']),
-                                            path=dirName)
+    cornerInfo = _load_corners(simParams, dirName, cornerInfo)
     speedThresh = float(trackParams['speedThresh'])
     default_spd = float(trackParams['default_spd'])
 
@@ -224,15 +255,22 @@ def ASCIT_Track(trackRun, simParams, trackParams,
 
     lasttime = _load_times(simParams, cornerInfo['volume_data'])
 
-    t = ascit.ASCIT(framesBack=int(trackParams['framesBack']),
-                    default_dir=float(trackParams['default_dir']))
-    for aVol in cornerInfo['volume_data'] :
-        currtime = aVol['volTime']
-        tDelta = currtime - lasttime
-        t.distThresh = speedThresh * tDelta
-        t._default_spd = default_spd * tDelta
-        t.TrackStep(aVol, tDelta)
-        lasttime = currtime
+    pool = _make_pool(trackParams)
+    try :
+        t = ascit.ASCIT(framesBack=int(trackParams['framesBack']),
+                        default_dir=float(trackParams['default_dir']),
+                        pool=pool)
+        for aVol in cornerInfo['volume_data'] :
+            currtime = aVol['volTime']
+            tDelta = currtime - lasttime
+            t.distThresh = speedThresh * tDelta
+            t._default_spd = default_spd * tDelta
+            t.TrackStep(aVol, tDelta)
+            lasttime = currtime
+    finally :
+        if pool is not None :
+            pool.close()
+            pool.join()
 
 
     # Tidy up tracks because there won't be any more data
@@ -252,5 +290,6 @@ _register_tracker(ASCIT_Track, "ASCIT",
                   dict(speedThresh="float(min=0.0)",
                        framesBack="integer(min=0, default=10)",
                        default_dir="float(min=-360.0, max=360.0, default=0.0)",
-                       default_spd="float(min=0.0, default=0.0)"))
+                       default_spd="float(min=0.0, default=0.0)",
+                       processes="integer(min=0, default=0)"))
 
@@ -1,12 +1,9 @@
 from __future__ import print_function
-from ZigZag.TrackUtils import volume_dtype, tracking_dtype, identifier_dtype
+from ZigZag.TrackUtils import volume_dtype, Corners2Cells
 import numpy as np
-import numpy.lib.recfunctions as nprf   # for append_fields()
 
-try :
-    from scikits.learn.utils.hungarian import _Hungarian
-except ImportError :
-    from sklearn.utils.hungarian import _Hungarian
+from ZigZag.Trackers.assignment import get_solver, gated_pairs, solve_gated
+from ZigZag.Trackers.trackstore import TrackStore
 
 from collections import defaultdict
 
@@ -20,13 +17,30 @@ class ASCIT(object) :
 
     *default_dir* is the default direction the storm should come "from"
                 in degrees using math angles.
+
+    *solver* is the name of the assignment solver to use
+             (see :mod:`ZigZag.Trackers.assignment`).  The default
+             is to use the fastest one available.
+
+    *sparse* is whether to consider only the pairs of storms that are
+             within *distThresh* of each other, solving the assignment
+             problem separately for each independent group of them.
+             Otherwise, the full cost matrix is used.
+
+    *pool* is an optional pool of processes (anything with a *map()*
+           method, like :class:`multiprocessing.Pool`) for solving the
+           independent groups in parallel when *sparse* is True.
     """
     _fallback_cost = 999999.0
 
     def __init__(self, distThresh=5.0, framesBack=10,
-                       default_dir=0.0, default_spd=0.0) :
+                       default_dir=0.0, default_spd=0.0, solver=None,
+                       sparse=True, pool=None) :
         self.distThresh = distThresh
         self._highCost = None
+        self._solver = get_solver(solver)
+        self._sparse = sparse
+        self._pool = pool
         self._frames_back = framesBack
         # Flip it around to point in the direction "to"
         self._default_dir = np.radians(default_dir + 180.0)
@@ -38,13 +52,25 @@ class ASCIT(object) :
 
         self.reinit_tracker()
 
+    @property
+    def tracks(self) :
+        """
+        The list of tracks (arrays of storm cells).  These are made from
+        the track store once by :meth:`finalize`.  Until then, a new
+        snapshot of the tracks is made every time.
+        """
+        if self._tracks is None :
+            return self._trackStore.tolist()
+        return self._tracks
+
     def reinit_tracker(self) :
         """
         Reinitialize the TITAN tracker for a new set of storm cells
         to track.
         """
         self.stateHist = []
-        self.tracks = []
+        self._trackStore = TrackStore()
+        self._tracks = None
         self.prevStorms = {}
         self._currCells = []
         self._fcasts = np.array([], dtype=[('xLocs', 'f4'), ('yLocs', 'f4')])
@@ -83,6 +109,16 @@ class ASCIT(object) :
         # the calculated cost for that association.
         return np.where(self._reject_assoc(C), self._highCost, C)
 
+    def _calc_gated_cost(self, t0_strms, t1_strms) :
+        """
+        Like :meth:`_calc_cost`, but only for the pairs of storms
+        that would not be rejected.  Returns the indices of the pairs
+        into *t0_strms* and *t1_strms* and their costs.
+        """
+        return gated_pairs(t0_strms['xLocs'], t0_strms['yLocs'],
+                           t1_strms['xLocs'], t1_strms['yLocs'],
+                           self.distThresh)
+
     def _reject_assoc(self, dist_val) :
         """ Reject this association because they were too far apart """
         return dist_val >= self.distThresh
@@ -97,10 +133,11 @@ class ASCIT(object) :
         #  could have a dtype of "float" and self._highCost is a numpy float,
         #  the type casting is different if I do element-wise comparison 
         # versus direct element-based comparisons
-        mask = (cost == self._highCost)
+        # A *cost* of None means that all of the *assocs* are acceptable.
+        mask = (cost == self._highCost) if cost is not None else None
 
         for t0_index, t1_index in assocs :
-            if mask[t0_index, t1_index] :
+            if mask is not None and mask[t0_index, t1_index] :
                 # Because of the rejection, split this
                 # association into the termination of
                 # one track and the start of a new track
@@ -108,7 +145,7 @@ class ASCIT(object) :
                 # TrackID will be assigned when the track is created
                 strms_start[t1_index] = None
             else :
-                if cost[t0_index, t1_index] > self._highCost :
+                if mask is not None and cost[t0_index, t1_index] > self._highCost :
                     print("SHOULD HAVE BEEN REJECTED!", \
                           cost[t0_index, t1_index] - self._highCost)
                 strms_keep[t1_index] = self.prevStorms[t0_index]
@@ -146,19 +183,7 @@ class ASCIT(object) :
             # The volume data has only xLocs and yLocs,
             # so we need to add some track-relevant fields
             # to the data without modifying the input data.
-            strmCnt = len(currStrms)
-            currStrms = nprf.append_fields(currStrms,
-                                           ('st_xLocs', 'st_yLocs',
-                                            'frameNums', 'types', 'trackID'),
-                                           ([np.nan] * strmCnt,
-                                            [np.nan] * strmCnt,
-                                            [currFrame] * strmCnt,
-                                            ['U'] * strmCnt,
-                                            [-1] * strmCnt),
-                                           dtypes=[dtype[1] for dtype in
-                                                   (tracking_dtype +
-                                                    identifier_dtype)],
-                                           usemask=False)
+            currStrms = Corners2Cells(currStrms, currFrame)
 
         assoc_dict = {curr:prev for prev, curr in assocs}
 
@@ -172,14 +197,12 @@ class ASCIT(object) :
             currStrms[strmID]['st_yLocs'] = self._fcasts['yLocs'][t0_index]
 
             # Update the last storm cell listed in the track as matched
-            self.tracks[trackID]['types'][-1] = 'M'
-            # A poor-man's append for numpy arrays...
-            self.tracks[trackID] = np.hstack((self.tracks[trackID],
-                                              currStrms[strmID]))
+            self._trackStore.set_type(trackID, 'M')
+            self._trackStore.append(trackID, currStrms[strmID])
 
         for strmID in strms_start.keys() :
             # Get the next available track ID number
-            trackID = len(self.tracks)
+            trackID = len(self._trackStore)
 
             # Provide a trackID for the strms_start dictionary
             # and the stormcell itself.
@@ -193,15 +216,14 @@ class ASCIT(object) :
             currStrms[strmID]['st_yLocs'] = currStrms[strmID]['yLocs']
 
             # Add this new track to the list.
-            self.tracks.append(np.array([currStrms[strmID]],
-                                        dtype=volume_dtype))
+            self._trackStore.new_track(currStrms[strmID])
 
         # Mark any length-1 tracks for strms_end as False Alarms
         for trackID in strms_end.values() :
-            if len(self.tracks[trackID]) == 1 :
-                self.tracks[trackID]['types'][-1] = 'F'
+            if self._trackStore.track_len(trackID) == 1 :
+                self._trackStore.set_type(trackID, 'F')
             else :
-                self.tracks[trackID]['types'][-1] = 'M'
+                self._trackStore.set_type(trackID, 'M')
 
     def TrackStep(self, volume_data, dT) :
         """
@@ -223,10 +245,20 @@ class ASCIT(object) :
 
 
 
-        C = self._calc_cost(self._fcasts, self._currCells)
-        H = _Hungarian()
-        # Returns a list of (row, col) tuples
-        assocs = H.compute(C)
+        if self._sparse :
+            # Only acceptable associations are returned, so there
+            # is no need for the cost matrix later.
+            C = None
+            assocs = solve_gated(*self._calc_gated_cost(self._fcasts,
+                                                        self._currCells),
+                                 shape=(len(self._fcasts),
+                                        len(self._currCells)),
+                                 solver=self._solver,
+                                 pool=self._pool)
+        else :
+            C = self._calc_cost(self._fcasts, self._currCells)
+            # Returns a list of (row, col) tuples
+            assocs = self._solver.compute(C)
 
         # Return the storms organized by their status.
         # strms_end  :  dict of storm indices for storms at index-1 with
@@ -260,10 +292,9 @@ class ASCIT(object) :
 
         fcasts = [None] * len(trackIDs)
         for fIndex, (trckID, trkSpd) in enumerate(zip(trackIDs, trackSpds)) :
-            fcasts[fIndex] = (self.tracks[trckID]['xLocs'][-1] +
-                               trkSpd['xLocs'] * deltaT,
-                              self.tracks[trckID]['yLocs'][-1] +
-                               trkSpd['yLocs'] * deltaT)
+            lastCell = self._trackStore.last(trckID)
+            fcasts[fIndex] = (lastCell['xLocs'] + trkSpd['xLocs'] * deltaT,
+                              lastCell['yLocs'] + trkSpd['yLocs'] * deltaT)
         return np.array(fcasts, dtype=[('xLocs', 'f4'), ('yLocs', 'f4')])
 
     def compute_speeds(self, trackIDs) :
@@ -276,9 +307,8 @@ class ASCIT(object) :
         trackCnt = 0
 
         for fIndex, trackIndex in enumerate(trackIDs) :
-            track = self.tracks[trackIndex][-frames_back:] \
-                    if frames_back > 0 else \
-                    self.tracks[trackIndex][0:0]    # return empty array
+            # An empty array if frames_back is zero
+            track = self._trackStore.tail(trackIndex, frames_back)
 
             if len(track) <= 1 :
                 continue
@@ -340,6 +370,7 @@ class ASCIT(object) :
         function will perform any last tidying up.
         """
         self._update_tracks(None, None, [], self.prevStorms, {}, {})
+        self._tracks = self._trackStore.tolist()
 
 
 if __name__ == '__main__' :
@@ -0,0 +1,301 @@
+"""
+Solvers for the linear assignment problem used by the trackers.
+
+Each solver is a class with a *compute(cost_matrix)* method that
+follows the same contract as :class:`ZigZag.Trackers.hungarian._Hungarian`:
+it returns a list of [row, col] pairs for the lowest-cost pairings
+between the rows and the columns of a (possibly rectangular) cost matrix.
+
+Available solvers are listed in *solverList*.  Use :func:`get_solver`
+to obtain an instance of a solver by name, or of the default solver.
+
+For large frames, most of the possible pairings are too far apart
+to be considered.  :func:`gated_pairs` finds just the candidate pairs
+within a distance threshold, and :func:`solve_gated` solves the
+assignment problem for those candidates one independent group at a time
+(optionally, in parallel).
+"""
+import numpy as np
+from scipy.spatial import cKDTree
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+
+from ZigZag.Trackers.hungarian import _Hungarian
+
+solverList = {}
+def _register_solver(solver, name) :
+    if name in solverList :
+        raise ValueError("%s is already a registered solver." % name)
+
+    solverList[name] = solver
+
+
+class _AssignmentSolver(object) :
+    """
+    Base class for the assignment solvers.
+
+    The cost matrix is transposed as needed so that the subclass's
+    *_solve()* only ever sees matrices with no more rows than columns.
+    The pairs are returned in the same order as :class:`_Hungarian`
+    would return them.
+    """
+    def compute(self, cost_matrix) :
+        """
+        Compute the indices for the lowest-cost pairings between rows and
+        columns in the database. Returns a list of [row, column] pairs
+        that can be used to traverse the matrix.
+        """
+        cost_matrix = np.atleast_2d(cost_matrix)
+
+        doTranspose = (cost_matrix.shape[1] < cost_matrix.shape[0])
+        C = cost_matrix.T if doTranspose else cost_matrix
+
+        if C.size == 0 :
+            return []
+
+        rows, cols = self._solve(np.asarray(C, dtype=float))
+
+        order = np.argsort(rows, kind='mergesort')
+        results = np.column_stack((rows[order], cols[order]))
+
+        # Swap the columns back because we did a transpose
+        # on the input cost matrix.
+        if doTranspose :
+            results = results[:, ::-1]
+
+        return results.tolist()
+
+    def _solve(self, C) :
+        """
+        Return the row and column index arrays of the assignments
+        for the cost matrix *C*, where C.shape[0] <= C.shape[1].
+        """
+        raise NotImplementedError()
+
+
+class _LAPJV(_AssignmentSolver) :
+    """
+    Shortest augmenting path solver in the style of Jonker and Volgenant.
+
+    Rows are added one at a time, and each one is assigned by finding
+    the shortest augmenting path through the columns, Dijkstra-style,
+    while maintaining the dual variables.  Each step of the search
+    works on all of the columns at once.
+
+    References
+    ==========
+
+    1. R. Jonker and A. Volgenant. A shortest augmenting path algorithm
+       for dense and sparse linear assignment problems. *Computing*,
+       38:325-340, 1987.
+
+    2. D.F. Crouse. On implementing 2D rectangular assignment algorithms.
+       *IEEE Transactions on Aerospace and Electronic Systems*,
+       52(4):1679-1696, 2016.
+    """
+    def _solve(self, C) :
+        if not np.all(np.isfinite(C)) :
+            raise ValueError("The cost matrix must be finite")
+
+        n, m = C.shape
+        # Dual variables for the rows and the columns
+        u = np.zeros(n)
+        v = np.zeros(m)
+        # Row assigned to each column (-1 for none)
+        colRow = -np.ones(m, dtype=int)
+        # Previous column on the shortest path to each column (-1 for
+        # the path's starting row)
+        pathBack = -np.ones(m, dtype=int)
+
+        for freeRow in range(n) :
+            shortest = np.empty(m)
+            shortest.fill(np.inf)
+            used = np.zeros(m, dtype=bool)
+            pathBack.fill(-1)
+
+            currRow = freeRow
+            currCol = -1
+            rowOffset = 0.0
+            while True :
+                # Reduced costs from the current row to every column
+                reduced = rowOffset + C[currRow] - u[currRow] - v
+                better = ~used & (reduced < shortest)
+                shortest[better] = reduced[better]
+                pathBack[better] = currCol
+
+                unused = np.where(used, np.inf, shortest)
+                currCol = np.argmin(unused)
+                rowOffset = unused[currCol]
+                used[currCol] = True
+
+                if colRow[currCol] < 0 :
+                    break
+                currRow = colRow[currCol]
+
+            # Update the dual variables
+            usedCols = np.flatnonzero(used)
+            u[freeRow] += rowOffset
+            otherCols = usedCols[usedCols != currCol]
+            u[colRow[otherCols]] += rowOffset - shortest[otherCols]
+            v[usedCols] -= rowOffset - shortest[usedCols]
+
+            # Augment along the path
+            while currCol >= 0 :
+                prevCol = pathBack[currCol]
+                colRow[currCol] = (colRow[prevCol] if prevCol >= 0 else
+                                   freeRow)
+                currCol = prevCol
+
+        cols = np.flatnonzero(colRow >= 0)
+        return colRow[cols], cols
+
+
+_register_solver(_Hungarian, "hungarian")
+_register_solver(_LAPJV, "lapjv")
+
+# Before v1.4, SciPy's solver was a pure-python Munkres implementation,
+# so it is only the default when it is the compiled one.
+_default_solver = "lapjv"
+try :
+    import scipy
+    from scipy.optimize import linear_sum_assignment
+
+    class _SciPyLSA(_AssignmentSolver) :
+        """
+        Wrapper around SciPy's assignment solver.
+        """
+        def _solve(self, C) :
+            return linear_sum_assignment(C)
+
+    _register_solver(_SciPyLSA, "scipy")
+    if tuple(int(v) for v in scipy.__version__.split('.')[:2]) >= (1, 4) :
+        _default_solver = "scipy"
+except ImportError :
+    pass
+
+
+def get_solver(name=None) :
+    """
+    Return an instance of the assignment solver registered as *name*.
+    By default, the fastest available solver is used.
+    """
+    if name is None :
+        name = _default_solver
+
+    if name not in solverList :
+        raise ValueError("Unknown assignment solver: %s.  Available: %s" %
+                         (name, ', '.join(sorted(solverList.keys()))))
+
+    return solverList[name]()
+
+
+def gated_pairs(x0, y0, x1, y1, maxDist) :
+    """
+    Find all of the pairs of points from (*x0*, *y0*) and (*x1*, *y1*)
+    that are less than *maxDist* apart.
+
+    Returns the indices into the first set of points, the indices into
+    the second set of points and the distances for those pairs.
+    The pairs are sorted by the first index, then by the second.
+    """
+    x0, y0, x1, y1 = [np.asarray(coord) for coord in (x0, y0, x1, y1)]
+    rows = np.array([], dtype=int)
+    cols = np.array([], dtype=int)
+
+    good0 = np.flatnonzero(np.isfinite(x0) & np.isfinite(y0))
+    good1 = np.flatnonzero(np.isfinite(x1) & np.isfinite(y1))
+    if len(good0) > 0 and len(good1) > 0 and maxDist > 0 :
+        tree0 = cKDTree(np.column_stack((x0[good0], y0[good0])))
+        tree1 = cKDTree(np.column_stack((x1[good1], y1[good1])))
+        # The search radius is padded a bit so that the check below,
+        # done in the same precision as the points, has the final say.
+        neighbors = tree0.query_ball_tree(tree1, maxDist * (1.0 + 1e-6))
+        rows = good0[np.repeat(np.arange(len(neighbors)),
+                               [len(hits) for hits in neighbors])]
+        cols = good1[np.array([hit for hits in neighbors for
+                               hit in sorted(hits)], dtype=int)]
+
+    dists = np.hypot(x0[rows] - x1[cols], y0[rows] - y1[cols])
+    keepers = dists < maxDist
+    return rows[keepers], cols[keepers], dists[keepers]
+
+def _solve_block(rows, cols, costs, solver) :
+    """
+    Solve the assignment problem for one connected group of candidate
+    pairs.  Only the assignments between candidate pairs are returned.
+    """
+    if len(rows) == 1 :
+        return [[rows[0], cols[0]]]
+
+    blockRows, rowIndex = np.unique(rows, return_inverse=True)
+    blockCols, colIndex = np.unique(cols, return_inverse=True)
+
+    # Any assignment not between candidates gets a cost so high that
+    # the solver would rather make as many candidate assignments
+    # as it can.
+    highCost = 10.0 * min(len(blockRows), len(blockCols)) * (costs.max() + 1.0)
+    C = np.empty((len(blockRows), len(blockCols)))
+    C.fill(highCost)
+    C[rowIndex, colIndex] = costs
+
+    return [[blockRows[i], blockCols[j]] for i, j in solver.compute(C) if
+            C[i, j] < highCost]
+
+def _solve_block_star(args) :
+    """ Unpack the arguments for :func:`_solve_block` for use with map() """
+    return _solve_block(*args)
+
+def solve_gated(rows, cols, costs, shape, solver=None, pool=None) :
+    """
+    Solve the assignment problem where only the candidate pairs
+    (*rows*[k], *cols*[k]) with cost *costs*[k] are allowed, for an
+    assignment problem of size *shape*.
+
+    The candidate pairs are split into the connected groups of rows and
+    columns that share candidates, and each group is solved separately
+    with *solver* (see :func:`get_solver`).
+
+    If *pool* is given (e.g., a :class:`multiprocessing.Pool`), its
+    *map()* is used to solve the groups in parallel.
+
+    Returns a list of [row, col] pairs, sorted by row, of just the
+    candidate pairs that were assigned.
+    """
+    if not hasattr(solver, 'compute') :
+        solver = get_solver(solver)
+
+    rows = np.asarray(rows, dtype=int)
+    cols = np.asarray(cols, dtype=int)
+    costs = np.asarray(costs, dtype=float)
+    if len(rows) == 0 :
+        return []
+
+    # Rows are the first shape[0] nodes of the graph, and the
+    # columns are the rest of the nodes.
+    graph = coo_matrix((np.ones(len(rows)), (rows, shape[0] + cols)),
+                       shape=(shape[0] + shape[1],) * 2)
+    groupCnt, labels = connected_components(graph, directed=False)
+    groups = labels[rows]
+
+    order = np.argsort(groups, kind='mergesort')
+    bounds = np.flatnonzero(np.diff(groups[order])) + 1
+
+    blocks = [(rows[pairs], cols[pairs], costs[pairs], solver) for
+              pairs in np.split(order, bounds)]
+
+    assocs = []
+    if pool is not None and len(blocks) > 1 :
+        # Single-pair groups are trivial, so they are not worth
+        # sending off to the pool.
+        bigBlocks = [block for block in blocks if len(block[0]) > 1]
+        for block in blocks :
+            if len(block[0]) == 1 :
+                assocs.extend(_solve_block(*block))
+        for blockAssocs in pool.map(_solve_block_star, bigBlocks) :
+            assocs.extend(blockAssocs)
+    else :
+        for block in blocks :
+            assocs.extend(_solve_block(*block))
+
+    assocs.sort()
+    return np.array(assocs, dtype=int).reshape(-1, 2).tolist()
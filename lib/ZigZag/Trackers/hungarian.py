@@ -69,8 +69,8 @@ class _Hungarian(object):
         # At this point, m >= n.
         self.n = n = self.C.shape[0]
         self.m = m = self.C.shape[1]
-        self.row_uncovered = np.ones(n, dtype=np.bool)
-        self.col_uncovered = np.ones(m, dtype=np.bool)
+        self.row_uncovered = np.ones(n, dtype=bool)
+        self.col_uncovered = np.ones(m, dtype=bool)
         self.Z0_r = 0
         self.Z0_c = 0
         self.path = np.zeros((n+m, 2), dtype=int)
@@ -148,9 +148,9 @@ class _Hungarian(object):
         left. Save the smallest uncovered value and Go to Step 6.
         """
         # We convert to int as numpy operations are faster on int
-        C = (self.C == 0).astype(np.int)
+        C = (self.C == 0).astype(int)
         covered_C = C*self.row_uncovered[:, np.newaxis]
-        covered_C *= self.col_uncovered.astype(np.int)
+        covered_C *= self.col_uncovered.astype(int)
         n = self.n
         m = self.m
         while True:
@@ -172,7 +172,7 @@ class _Hungarian(object):
                     self.row_uncovered[row] = False
                     self.col_uncovered[col] = True
                     covered_C[:, col] = C[:, col]*(
-                                self.row_uncovered.astype(np.int))
+                                self.row_uncovered.astype(int))
                     covered_C[row] = 0
 
 
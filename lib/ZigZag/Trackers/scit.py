@@ -1,7 +1,7 @@
 from __future__ import print_function
 import numpy as np
-import numpy.lib.recfunctions as nprf       # for append_fields()
-from ZigZag.TrackUtils import volume_dtype, tracking_dtype, identifier_dtype
+from ZigZag.TrackUtils import Corners2Cells
+from ZigZag.Trackers.trackstore import TrackStore
 
 
 
@@ -14,26 +14,17 @@ def TrackStep_SCIT(strmAdap, stateHist, strmTracks, infoTracks, volume_Data,
     # strmHist is a vector containing info for what happened at each time-step
     # volume_Data contains the current volume's storm cells
     # strmAdap parameterizes the algorithm
+    # strmTracks is a TrackStore of the storm tracks
 
     if deltaT >= strmAdap['max_timestep'] :
         # Too large a timestep... reset the tracker.
         EndTracks(stateHist, strmTracks)
 
-    strmCnt = len(volume_Data['stormCells'])
     # The volume data has only xLocs and yLocs,
     # so we need to add some track-relevant fields
     # to the data without modifying the input data.
-    currStrms = nprf.append_fields(volume_Data['stormCells'],
-                                   ('st_xLocs', 'st_yLocs', 
-                                    'frameNums', 'types', 'trackID'),
-                                   ([np.nan] * strmCnt, [np.nan] * strmCnt,
-                                    [volume_Data['frameNum']] * strmCnt,
-                                    ['U'] * strmCnt,
-                                    [-1] * strmCnt),
-                                   dtypes=[dtype[1] for dtype in
-                                           (tracking_dtype +
-                                            identifier_dtype)],
-                                   usemask=False)
+    currStrms = Corners2Cells(volume_Data['stormCells'],
+                              volume_Data['frameNum'])
 
     BestLocs(stateHist, strmTracks, infoTracks, deltaT)
     Correl_Storms(strmAdap, currStrms,
@@ -46,9 +37,12 @@ def TrackStep_SCIT(strmAdap, stateHist, strmTracks, infoTracks, volume_Data,
      tracksToAdd) = EndTracks(stateHist, strmTracks, currStrms)
 
 
+    # Keeping the IDs of the active tracks with the frame so that
+    # the next timestep doesn't need to rediscover them.
     stateHist.append({'volTime': volume_Data['volTime'],
                       'frameNum': volume_Data['frameNum'],
-                      'stormCells': currStrms})
+                      'stormCells': currStrms,
+                      'trackIDs': _unique_trackIDs(currStrms)})
 
     return tracksToEnd, tracksToKeep, tracksToAdd
 
@@ -62,7 +56,7 @@ def EndTracks(stateHist, strmTracks, currStrms=None) :
     tracking and want to finalize the tracks.
     """
     if currStrms is not None :
-        currTracks = set(currStrms['trackID'])
+        currTracks = set(_unique_trackIDs(currStrms))
     else :
         currTracks = set([])
 
@@ -70,9 +64,8 @@ def EndTracks(stateHist, strmTracks, currStrms=None) :
         # Ah, there is no history, therefore, there are no established tracks
         return set([]), set([]), currTracks
 
-    # build list of track ids for the stormcells in the previous frame
-    prevTracks = set([aCell['trackID'] for aCell in
-                      stateHist[-1]['stormCells'] if aCell['trackID'] >= 0])
+    # track ids for the stormcells in the previous frame
+    prevTracks = set(_active_trackIDs(stateHist))
 
 
     # Find the set difference of the list of tracks.
@@ -93,12 +86,12 @@ def EndTracks(stateHist, strmTracks, currStrms=None) :
     #          it belonged to a track.
     #  Maybe some other tasks?
     for aTrackID in tracksToEnd :
-        if len(strmTracks[aTrackID]) > 1 :
+        if strmTracks.track_len(aTrackID) > 1 :
             # Mark the last storm cell in the track as "matched"
-            strmTracks[aTrackID]['types'][-1] = 'M'
+            strmTracks.set_type(aTrackID, 'M')
         else :
             # Mark a length-1 track as a False alarm.
-            strmTracks[aTrackID]['types'][-1] = 'F'
+            strmTracks.set_type(aTrackID, 'F')
 
     return tracksToEnd, tracksToKeep, tracksToAdd
 
@@ -110,36 +103,31 @@ def Correl_Storms(strmAdap, currStorms,
     contTracks = []
     distThresh = (strmAdap['spdThresh'] * deltaT) ** 2
 
+    # Only the tracks that have not been matched yet (a 'U' type
+    # at the end of the track) can be continued.  These are all
+    # to be found in the previous frame.  Their forecasted locations
+    # (from BestLocs()) are gathered up in ascending track ID order.
+    trackIDs = _active_trackIDs(stateHist)
+    trackIDs = np.array([trackID for trackID in trackIDs if
+                         strmTracks.last(trackID)['types'] == 'U'], dtype=int)
+    fcast_x = np.array([infoTracks[trackID]['fcasts'][-1]['xLocs'] for
+                        trackID in trackIDs], dtype=float)
+    fcast_y = np.array([infoTracks[trackID]['fcasts'][-1]['yLocs'] for
+                        trackID in trackIDs], dtype=float)
+
+    # Squared distances between the current storms (rows) and
+    # the forecasts of the active tracks (columns).
+    cellDists = ((currStorms['xLocs'][:, np.newaxis] - fcast_x)**2 +
+                 (currStorms['yLocs'][:, np.newaxis] - fcast_y)**2)
+    # Anything not below the threshold can never be a match.
+    cellDists[~(cellDists < distThresh)] = np.inf
+
     # Looping over the current storms to compare against the previous storms
-    for newCell in currStorms :
-        bestMatch = {'prevIndx': None, 
-                     'dist': distThresh}
-
-        #if len(infoTracks) != len(strmTracks) :
-        #    print("WARNING in Correl_Storms()")
-
-        for trackID, (infoTrack, track) in enumerate(zip(infoTracks,
-                                                         strmTracks)) :
-            # equal to 'U' means that storm hasn't been matched yet.
-            if track['types'][-1] == 'U':
-                """
-                ### --- Outdated consistency check --- ###
-                if track['frameNums'][-1] != (volTime - 1) :
-                    print("WARNING! Expected frame num: ", volTime - 1)
-                    print("New Cell:", newCell)
-                    print("Old Cell:", track[-1])
-                    continue
-                """
-
-                # Grab the forecasted location for the current point,
-                # which can be found in its track's 'fcasts' element.
-                cellDist = CalcDistSqrd(newCell,
-                                        infoTrack['fcasts'][-1])
-                if cellDist < bestMatch['dist'] :
-                    bestMatch = {'prevIndx': trackID, 'dist': cellDist}
-
-
-        if bestMatch['prevIndx'] is not None :
+    for newCell, dists in zip(currStorms, cellDists) :
+        # The first track with the smallest distance wins.
+        bestIndx = np.argmin(dists) if len(dists) > 0 else None
+
+        if bestIndx is not None and np.isfinite(dists[bestIndx]) :
             # Note how it goes ahead and matches with the first storm cell
             # it finds that is below the threshold. I believe this to be
             # a bug that can cause "track-stealing" as the algorithm does
@@ -153,14 +141,13 @@ def Correl_Storms(strmAdap, currStorms,
             # cell centroids. However, note that any sort of sorting must be
             # done outside of the SCIT tracking functions. In other words,
             # the passed-in storm cells should have already been sorted.
-
-            #matchedStorm = prevStorms[bestMatch['prevIndx']]
-
-            track = strmTracks[bestMatch['prevIndx']]
+            bestMatch = {'prevIndx': trackIDs[bestIndx],
+                         'dist': dists[bestIndx]}
 
             # Indicate that the storm in the previous frame has
-            # now been matched.
-            track['types'][-1] = 'M'
+            # now been matched, so no other storm can match with it.
+            strmTracks.set_type(bestMatch['prevIndx'], 'M')
+            cellDists[:, bestIndx] = np.inf
             contTracks.append((newCell, bestMatch))
 
         else :
@@ -172,11 +159,11 @@ def Correl_Storms(strmAdap, currStorms,
     for newCell, bestMatch in contTracks :
         trackID = bestMatch['prevIndx']
 
-        track = strmTracks[trackID]
         infoTrack = infoTracks[trackID]
 
         infoTrack['distErrs'].append(np.sqrt(bestMatch['dist']))
-        infoTrack['dists'].append(np.sqrt(CalcDistSqrd(newCell, track[-1])))
+        infoTrack['dists'].append(np.sqrt(CalcDistSqrd(newCell,
+                                                strmTracks.last(trackID))))
 
         # Assigning the current storm its track ID number, and
         # the state-estimated position
@@ -185,7 +172,7 @@ def Correl_Storms(strmAdap, currStorms,
         newCell['st_yLocs'] = infoTrack['fcasts'][-1]['yLocs']
 
         # Adding a new point to the established storm track
-        strmTracks[trackID] = np.hstack((track, newCell))
+        strmTracks.append(trackID, newCell)
 
     for aTrack in newTracks :
         # Assigning this track the next trackID number and
@@ -199,7 +186,7 @@ def Correl_Storms(strmAdap, currStorms,
                            'fcasts': [],
                            'speed_x': [],
                            'speed_y': []})
-        strmTracks.append(np.array([aTrack], dtype=volume_dtype))
+        strmTracks.new_track(aTrack)
 
 
 def CalcDistSqrd(cellA, cellB) :
@@ -207,6 +194,27 @@ def CalcDistSqrd(cellA, cellB) :
             (cellA['yLocs'] - cellB['yLocs'])**2 )
 
 
+def _unique_trackIDs(stormCells) :
+    """
+    Sorted, unique track IDs of the *stormCells* that are part of a track.
+    """
+    trackIDs = np.unique(stormCells['trackID'])
+    return trackIDs[trackIDs >= 0]
+
+def _active_trackIDs(stateHist) :
+    """
+    Sorted, unique track IDs of the tracks that were active
+    in the last frame of *stateHist*.
+    """
+    if len(stateHist) == 0 :
+        return np.array([], dtype=int)
+
+    lastFrame = stateHist[-1]
+    if 'trackIDs' not in lastFrame :
+        lastFrame['trackIDs'] = _unique_trackIDs(lastFrame['stormCells'])
+    return lastFrame['trackIDs']
+
+
 def BestLocs(stateHist, strmTracks, infoTracks, deltaT) :
     """
     Forecast where the active tracks will go.
@@ -217,15 +225,13 @@ def BestLocs(stateHist, strmTracks, infoTracks, deltaT) :
         # Any storm cell that is part of an active track has a
         # positive trackID value.
         # Obtain unique set of active track IDs.
-        trackIDs = set([stormCell['trackID'] for stormCell in
-                        stateHist[-1]['stormCells'] if
-                        stormCell['trackID'] >= 0])
+        trackIDs = _active_trackIDs(stateHist)
         for index in trackIDs :
             info = infoTracks[index]
-            strm = strmTracks[index]
-            info['fcasts'].append({'xLocs': strm['xLocs'][-1] +
+            lastCell = strmTracks.last(index)
+            info['fcasts'].append({'xLocs': lastCell['xLocs'] +
                                            (info['speed_x'][-1] * deltaT),
-                                   'yLocs': strm['yLocs'][-1] +
+                                   'yLocs': lastCell['yLocs'] +
                                            (info['speed_y'][-1] * deltaT)})
 
 
@@ -245,16 +251,14 @@ def Compute_Speed(strmAdap, currStorms, strmTracks, infoTracks,
     # Gonna first calculate the track speed for all established tracks
     # in order to determine an overall average speed to use for initializing
     # the speed for un-established tracks.
-    trackIDs = [stormCell['trackID'] for stormCell in currStorms if
-                stormCell['trackID'] >= 0]
+    trackIDs = currStorms['trackID'][currStorms['trackID'] >= 0]
     #strmIDs = [stormCell['cornerIDs'] for stormCell in currStorms if
     #           stormCell['trackID'] >= 0]
     for index in trackIDs :
 
         theTrackInfo = infoTracks[index]
-        aTrack = strmTracks[index][-framesBack:] \
-                 if framesBack > 0 else \
-                 strmTracks[index][0:0]     # return empty array
+        # An empty array if framesBack is zero
+        aTrack = strmTracks.tail(index, framesBack)
 
         if len(aTrack) > 1 :
             xAvg = np.mean(aTrack['xLocs'])
@@ -326,7 +330,7 @@ if __name__ == '__main__' :
                 'default_dir': 225.0,
                 'max_timestep': 15.0}
     stateHist = []
-    strmTracks = []
+    strmTracks = TrackStore()
     infoTracks = []
 
     deltaT = cornerVol[1]['volTime'] - cornerVol[0]['volTime']
@@ -339,7 +343,7 @@ if __name__ == '__main__' :
     EndTracks(stateHist, strmTracks)
 
     falarms = []
-    tracks = strmTracks
+    tracks = strmTracks.tolist()
     CleanupTracks(tracks, falarms)
 
     # Compare with "truth data"
@@ -1,9 +1,9 @@
 from __future__ import print_function
-from ZigZag.TrackUtils import volume_dtype, tracking_dtype, identifier_dtype
+from ZigZag.TrackUtils import volume_dtype, Corners2Cells
 import numpy as np
-import numpy.lib.recfunctions as nprf   # for append_fields()
 
-from ZigZag.Trackers.hungarian import _Hungarian
+from ZigZag.Trackers.assignment import get_solver, gated_pairs, solve_gated
+from ZigZag.Trackers.trackstore import TrackStore
 
 from collections import defaultdict
 
@@ -18,13 +18,30 @@ class TITAN(object) :
 
     *distThresh* is the maximum distance storms are expected to travel
                  in the frame intervals.
+
+    *solver* is the name of the assignment solver to use
+             (see :mod:`ZigZag.Trackers.assignment`).  The default
+             is to use the fastest one available.
+
+    *sparse* is whether to consider only the pairs of storms that are
+             within *distThresh* of each other, solving the assignment
+             problem separately for each independent group of them.
+             Otherwise, the full cost matrix is used.
+
+    *pool* is an optional pool of processes (anything with a *map()*
+           method, like :class:`multiprocessing.Pool`) for solving the
+           independent groups in parallel when *sparse* is True.
     """
     _fallback_cost = 999999.0
 
-    def __init__(self, distWeight=0.5, distThresh=5.0) :
+    def __init__(self, distWeight=0.5, distThresh=5.0, solver=None,
+                       sparse=True, pool=None) :
         self.distWeight = distWeight
         self.distThresh = distThresh
         self._highCost = None
+        self._solver = get_solver(solver)
+        self._sparse = sparse
+        self._pool = pool
 
         # If the cost threshold is set larger than
         # the fallback cost, then nothing works right
@@ -63,13 +80,25 @@ class TITAN(object) :
     def volWeight(self, w) :
         self.distWeight = 1.0 - w
 
+    @property
+    def tracks(self) :
+        """
+        The list of tracks (arrays of storm cells).  These are made from
+        the track store once by :meth:`finalize`.  Until then, a new
+        snapshot of the tracks is made every time.
+        """
+        if self._tracks is None :
+            return self._trackStore.tolist()
+        return self._tracks
+
     def reinit_tracker(self) :
         """
         Reinitialize the TITAN tracker for a new set of storm cells
         to track.
         """
         self.stateHist = []
-        self.tracks = []
+        self._trackStore = TrackStore()
+        self._tracks = None
         self.prevStorms = {}
         self._currCells = []
         self.ellipses = []
@@ -113,6 +142,23 @@ class TITAN(object) :
         # the calculated cost for that association.
         return np.where(self._reject_assoc(dp), self._highCost, C)
 
+    def _calc_gated_cost(self, t0_strms, t1_strms) :
+        """
+        Like :meth:`_calc_cost`, but only for the pairs of storms
+        that would not be rejected.  Returns the indices of the pairs
+        into *t0_strms* and *t1_strms* and their costs.
+        """
+        t0_index, t1_index, dp = gated_pairs(t0_strms['xLocs'],
+                                             t0_strms['yLocs'],
+                                             t1_strms['xLocs'],
+                                             t1_strms['yLocs'],
+                                             self.distThresh)
+        dv = np.abs(np.sqrt(t0_strms['sizes'][t0_index]) -
+                    np.sqrt(t1_strms['sizes'][t1_index]))
+
+        return (t0_index, t1_index,
+                (self.distWeight * dp) + (self.volWeight * dv))
+
     def _reject_assoc(self, dist_val) :
         """ Reject this association because they were too far apart """
         return dist_val >= self.distThresh
@@ -127,10 +173,11 @@ class TITAN(object) :
         #  could have a dtype of "float" and self._highCost is a numpy float,
         #  the type casting is different if I do element-wise comparison 
         # versus direct element-based comparisons
-        mask = (cost == self._highCost)
+        # A *cost* of None means that all of the *assocs* are acceptable.
+        mask = (cost == self._highCost) if cost is not None else None
 
         for t0_index, t1_index in assocs :
-            if mask[t0_index, t1_index] :
+            if mask is not None and mask[t0_index, t1_index] :
                 # Because of the rejection, split this
                 # association into the termination of
                 # one track and the start of a new track
@@ -138,7 +185,7 @@ class TITAN(object) :
                 # TrackID will be assigned when the track is created
                 strms_start[t1_index] = None
             else :
-                if cost[t0_index, t1_index] > self._highCost :
+                if mask is not None and cost[t0_index, t1_index] > self._highCost :
                     print("SHOULD HAVE BEEN REJECTED!", \
                           cost[t0_index, t1_index] - self._highCost)
                 strms_keep[t1_index] = self.prevStorms[t0_index]
@@ -315,19 +362,7 @@ class TITAN(object) :
             # The volume data has only xLocs and yLocs,
             # so we need to add some track-relevant fields
             # to the data without modifying the input data.
-            strmCnt = len(currStrms)
-            currStrms = nprf.append_fields(currStrms,
-                                           ('st_xLocs', 'st_yLocs',
-                                            'frameNums', 'types', 'trackID'),
-                                           ([np.nan] * strmCnt,
-                                            [np.nan] * strmCnt,
-                                            [currFrame] * strmCnt,
-                                            ['U'] * strmCnt,
-                                            [-1] * strmCnt),
-                                           dtypes=[dtype[1] for dtype in
-                                                   (tracking_dtype +
-                                                    identifier_dtype)],
-                                           usemask=False)
+            currStrms = Corners2Cells(currStrms, currFrame)
 
 
         for strmID, trackID in strms_keep.iteritems() :
@@ -336,17 +371,16 @@ class TITAN(object) :
             # position that would result in a zero-cost for the position
             # portion of the cost function (i.e., the last position in
             # the track).
-            currStrms[strmID]['st_xLocs'] = self.tracks[trackID]['xLocs'][-1]
-            currStrms[strmID]['st_yLocs'] = self.tracks[trackID]['yLocs'][-1]
+            lastCell = self._trackStore.last(trackID)
+            currStrms[strmID]['st_xLocs'] = lastCell['xLocs']
+            currStrms[strmID]['st_yLocs'] = lastCell['yLocs']
             # Update the last storm cell listed in the track as matched
-            self.tracks[trackID]['types'][-1] = 'M'
-            # A poor-man's append for numpy arrays...
-            self.tracks[trackID] = np.hstack((self.tracks[trackID],
-                                              currStrms[strmID]))
+            self._trackStore.set_type(trackID, 'M')
+            self._trackStore.append(trackID, currStrms[strmID])
 
         for strmID in strms_start.keys() :
             # Get the next available track ID number
-            trackID = len(self.tracks)
+            trackID = len(self._trackStore)
 
             # Provide a trackID for the strms_start dictionary
             # and the stormcell itself.
@@ -360,15 +394,14 @@ class TITAN(object) :
             currStrms[strmID]['st_yLocs'] = currStrms[strmID]['yLocs']
 
             # Add this new track to the list.
-            self.tracks.append(np.array([currStrms[strmID]],
-                                        dtype=volume_dtype))
+            self._trackStore.new_track(currStrms[strmID])
 
         # Mark any length-1 tracks for strms_end as False Alarms
         for trackID in strms_end.values() :
-            if len(self.tracks[trackID]) == 1 :
-                self.tracks[trackID]['types'][-1] = 'F'
+            if self._trackStore.track_len(trackID) == 1 :
+                self._trackStore.set_type(trackID, 'F')
             else :
-                self.tracks[trackID]['types'][-1] = 'M'
+                self._trackStore.set_type(trackID, 'M')
 
     def TrackStep(self, volume_data, ellipses=None) :
         """
@@ -401,10 +434,20 @@ class TITAN(object) :
                              if ellipses is None else
                              ellipses)
 
-        C = self._calc_cost(self._prevCells, self._currCells)
-        H = _Hungarian()
-        # Returns a list of (row, col) tuples
-        assocs = H.compute(C)
+        if self._sparse :
+            # Only acceptable associations are returned, so there
+            # is no need for the cost matrix later.
+            C = None
+            assocs = solve_gated(*self._calc_gated_cost(self._prevCells,
+                                                        self._currCells),
+                                 shape=(len(self._prevCells),
+                                        len(self._currCells)),
+                                 solver=self._solver,
+                                 pool=self._pool)
+        else :
+            C = self._calc_cost(self._prevCells, self._currCells)
+            # Returns a list of (row, col) tuples
+            assocs = self._solver.compute(C)
 
         # Return the storms organized by their status.
         # strms_end  :  dict of storm indices for storms at index-1 with
@@ -470,21 +513,19 @@ class TITAN(object) :
         fcasts = [None] * len(trackIDs)
         trends = [None] * len(trackIDs)
         for fIndex, trackIndex in enumerate(trackIDs) :
-            track = self.tracks[trackIndex]
-
             # Grab only the variables you want for at most the past
             # *frames_back* frames.
-            x = track[params][-frames_back:] \
-                if frames_back > 0 else \
-                track[params][0:0]      # return empty array
+            track = self._trackStore.tail(trackIndex, frames_back)
+            trackLen = self._trackStore.track_len(trackIndex)
+            x = track[params]
 
-            dF = np.diff(track['frameNums'][-frames_back:]) \
+            dF = np.diff(track['frameNums']) \
                  if frames_back > 0 else \
                  np.zeros((0,))
 
             trnd = np.zeros((1,), dtype=x.dtype)
 
-            if len(track) > 1 :
+            if trackLen > 1 :
                 tmp = np.empty((1,), dtype=x.dtype)
 
                 for p in params :
@@ -494,7 +535,7 @@ class TITAN(object) :
                 fcasts[fIndex] = np.array(tmp[0])
 
 
-            elif len(track) == 1 :
+            elif trackLen == 1 :
                 # Do a persistence fcast
                 fcasts[fIndex] = np.array(x[-1])
 
@@ -519,7 +560,7 @@ class TITAN(object) :
             # Assume aspect ratio and angle remains the same
             h = np.squeeze(f['xLocs'])
             k = np.squeeze(f['yLocs'])
-            szChange = np.sqrt(self.tracks[trackIDs[index]][-1]['sizes'] /
+            szChange = np.sqrt(self._trackStore.last(trackIDs[index])['sizes'] /
                                f['sizes'])
             a = ellpse[1] / szChange
             b = ellpse[2] / szChange
@@ -702,6 +743,7 @@ class TITAN(object) :
         function will perform any last tidying up.
         """
         self._update_tracks(None, None, self.prevStorms, {}, {})
+        self._tracks = self._trackStore.tolist()
 
 
 if __name__ == '__main__' :
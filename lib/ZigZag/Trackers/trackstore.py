@@ -0,0 +1,86 @@
+"""
+Growable storage of the tracks while a tracker is running.
+
+Rather than appending a storm cell to a track by making a whole new array
+for the track, every storm cell of every track is kept in one structured
+array that doubles in capacity whenever it runs out of room.  Each track
+is a list of the indices of its storm cells within that array.
+The usual list of track arrays is made only when asked for
+(see :meth:`TrackStore.tolist`).
+"""
+import numpy as np
+
+from ZigZag.TrackUtils import volume_dtype
+
+
+class TrackStore(object) :
+    """
+    Tracks of storm cells, with amortized O(1) appends.
+
+    *dtype* is the dtype of the storm cells.
+
+    *capacity* is the initial number of storm cells that can be held
+               before the storage needs to grow.
+    """
+    def __init__(self, dtype=volume_dtype, capacity=64) :
+        self._cells = np.empty(max(int(capacity), 1), dtype=dtype)
+        self._cellCnt = 0
+        self._trackCells = []
+
+    def __len__(self) :
+        """ Number of tracks """
+        return len(self._trackCells)
+
+    def _add_cell(self, cell) :
+        if self._cellCnt == len(self._cells) :
+            cells = np.empty(2 * len(self._cells), dtype=self._cells.dtype)
+            cells[:self._cellCnt] = self._cells
+            self._cells = cells
+
+        self._cells[self._cellCnt] = cell
+        self._cellCnt += 1
+        return self._cellCnt - 1
+
+    def new_track(self, cell) :
+        """
+        Start a new track with the storm cell *cell*.
+        Returns the ID of the new track.
+        """
+        self._trackCells.append([self._add_cell(cell)])
+        return len(self._trackCells) - 1
+
+    def append(self, trackID, cell) :
+        """ Add the storm cell *cell* to the end of track *trackID* """
+        self._trackCells[trackID].append(self._add_cell(cell))
+
+    def track_len(self, trackID) :
+        """ Number of storm cells in track *trackID* """
+        return len(self._trackCells[trackID])
+
+    def last(self, trackID) :
+        """ A copy of the last storm cell of track *trackID* """
+        return self._cells[self._trackCells[trackID][-1]].copy()
+
+    def set_type(self, trackID, cellType, index=-1) :
+        """
+        Set the type of the storm cell at *index* (by default, the last
+        one) in track *trackID*.
+        """
+        self._cells['types'][self._trackCells[trackID][index]] = cellType
+
+    def tail(self, trackID, count) :
+        """
+        A copy of the last *count* storm cells of track *trackID*.
+        A *count* of zero (or less) gives an empty array.
+        """
+        cellIndices = (self._trackCells[trackID][-count:] if count > 0 else
+                       [])
+        return self._cells[np.array(cellIndices, dtype=int)]
+
+    def track(self, trackID) :
+        """ A copy of the track *trackID* """
+        return self._cells[np.array(self._trackCells[trackID], dtype=int)]
+
+    def tolist(self) :
+        """ A list of copies of all of the tracks """
+        return [self.track(trackID) for trackID in range(len(self))]
@@ -2,23 +2,177 @@ import numpy as np
 from scipy import stats
 
 
+# Statistics that take an *axis* argument, so that all of the resamples
+# can be evaluated in one call on a stacked array of the resamples.
+# Maps each statistic to its default axis.
+axis_funcs = {}
+def _register_axis_func(func, default_axis=None) :
+    axis_funcs[func] = default_axis
+
+for _func in (np.mean, np.median, np.sum, np.std, np.var, np.amin, np.amax) :
+    _register_axis_func(_func)
+_register_axis_func(stats.trim_mean, 0)
+
+# Upper limit on the size of the stacked resamples for a batched
+# evaluation.  Any more than that, and the resamples are done in chunks.
+batch_bytes = 64 * 2**20
+
+def _batch_apply(bootfunc, inputData, sampIndex, func_args, func_kwargs) :
+    """
+    Evaluate *bootfunc* on each resample, inputData[sampIndex[i], ...].
+
+    If *bootfunc* is in *axis_funcs*, then the resamples are stacked up
+    and evaluated in as few calls as *batch_bytes* allows, otherwise
+    they are evaluated one at a time.
+    """
+    if bootfunc not in axis_funcs :
+        return [bootfunc(inputData[samp, ...], *func_args, **func_kwargs)
+                for samp in sampIndex]
+
+    # The statistic's axis shifts over by one for the stacked resamples.
+    # A statistic of the flattened data (axis=None) is taken along all
+    # of the other axes.
+    axis = func_kwargs.get('axis', axis_funcs[bootfunc])
+    func_kwargs = dict(func_kwargs)
+    func_kwargs['axis'] = (1 if axis is None else
+                           (axis % inputData.ndim) + 1)
+
+    sampBytes = max(1, sampIndex.shape[1] * inputData[:1].nbytes)
+    chunkSize = max(1, batch_bytes // sampBytes)
+    bstat = []
+    start = 0
+    while start < len(sampIndex) :
+        try :
+            samps = inputData[sampIndex[start:start + chunkSize], ...]
+            if axis is None :
+                samps = samps.reshape(len(samps), -1)
+            bstat.append(bootfunc(samps, *func_args, **func_kwargs))
+        except MemoryError :
+            if chunkSize == 1 :
+                raise
+            chunkSize = max(1, chunkSize // 2)
+            continue
+
+        start += chunkSize
+
+    return np.concatenate(bstat, axis=0)
+
+
+def _loo_data(inputData, axis, **otherKwargs) :
+    """
+    Check that the closed-form leave-one-out replicates apply: the
+    statistic is taken along the first axis of plain, finite data with at
+    least two samples, and there are no other keyword arguments.
+    Returns the data as a float array if so, None otherwise.
+    """
+    if (axis is None or axis % max(inputData.ndim, 1) != 0 or
+        len(otherKwargs) > 0 or isinstance(inputData, np.ma.MaskedArray) or
+        inputData.ndim == 0 or inputData.shape[0] < 2) :
+        return None
+
+    data = np.asarray(inputData, dtype=float)
+    if not np.all(np.isfinite(data)) :
+        return None
+    return data
+
+def _jackknife_sum(inputData, axis=None, **kwargs) :
+    data = _loo_data(inputData, axis, **kwargs)
+    if data is None :
+        return None
+    return data.sum(axis=0) - data
+
+def _jackknife_mean(inputData, axis=None, **kwargs) :
+    data = _loo_data(inputData, axis, **kwargs)
+    if data is None :
+        return None
+    return (data.sum(axis=0) - data) / (len(data) - 1)
+
+def _jackknife_trim_mean(inputData, proportiontocut, axis=0, **kwargs) :
+    data = _loo_data(inputData, axis, **kwargs)
+    if data is None :
+        return None
+
+    # Each leave-one-out sample has n - 1 points, and the trimmed mean
+    # keeps the points ranked [lowercut, uppercut) of those.
+    n = len(data)
+    lowercut = int(proportiontocut * (n - 1))
+    uppercut = (n - 1) - lowercut
+    if lowercut >= uppercut :
+        return None
+
+    # Work on the samples as columns of a 2-D array.
+    shape = data.shape
+    data = data.reshape(n, -1)
+    cols = np.arange(data.shape[1])
+    ranks = np.argsort(np.argsort(data, axis=0, kind='mergesort'), axis=0,
+                       kind='mergesort')
+    prefix = np.zeros((n + 1, data.shape[1]))
+    np.cumsum(np.sort(data, axis=0), axis=0, out=prefix[1:])
+
+    # Leaving out the point of rank r shifts the kept ranks at or above r
+    # up by one, so the kept points are the sorted points [lowercut, r)
+    # and [r + 1, uppercut + 1), clipped to the kept range.
+    low = np.clip(ranks, lowercut, uppercut)
+    high = np.clip(ranks + 1, lowercut + 1, uppercut + 1)
+    total = ((prefix[low, cols] - prefix[lowercut]) +
+             (prefix[uppercut + 1] - prefix[high, cols]))
+    return (total / (uppercut - lowercut)).reshape(shape)
+
+# Statistics whose jackknife replicates can be computed directly,
+# without evaluating the statistic on each leave-one-out sample.
+# Each fast function takes the same arguments as its statistic, and
+# returns the replicates (the i-th one leaving out the i-th sample),
+# or None if it can not handle those arguments.
+jackknife_funcs = {}
+def _register_jackknife(func, fastfunc) :
+    jackknife_funcs[func] = fastfunc
+
+_register_jackknife(np.sum, _jackknife_sum)
+_register_jackknife(np.mean, _jackknife_mean)
+_register_jackknife(stats.trim_mean, _jackknife_trim_mean)
+
+
 def jackknife(bootfunc, inputData, *func_args, **func_kwargs) :
+    """
+    Compute the jackknife (leave-one-out) replicates of the statistic
+    *bootfunc* of *inputData*, leaving out one sample along the first
+    axis at a time.
+
+    Statistics in *jackknife_funcs* have their replicates computed
+    directly in O(n) memory (O(n log n) time for the trimmed mean),
+    for the usual case of the statistic along the first axis.
+    """
     inputData = np.asanyarray(inputData)
+    if bootfunc in jackknife_funcs :
+        jstat = jackknife_funcs[bootfunc](inputData, *func_args, **func_kwargs)
+        if jstat is not None :
+            # The leave-one-out grid below leaves out the last sample
+            # first, so the replicates are put in that same order.
+            return np.atleast_2d(jstat[::-1])
+
     n = inputData.shape[0]
     i = np.arange(n)
     # Produce a grid of index numbers such that each row
     # contains all indices except one.  Each element is skipped once.
     ins = (i[np.newaxis, :-1] - i[:, np.newaxis]) % n
-    return np.atleast_2d([bootfunc(inputData[aSamp, ...], *func_args, **func_kwargs)
-                         for aSamp in ins])
+    return np.atleast_2d(_batch_apply(bootfunc, inputData, ins,
+                                      func_args, func_kwargs))
 
 
 def bootstrap(N, bootfunc, inputData, *func_args, **func_kwargs) :
+    """
+    Compute *N* bootstrap replicates of the statistic *bootfunc* of
+    *inputData*, resampling along the first axis.
+
+    Statistics in *axis_funcs* are computed for many replicates at
+    a time (see *batch_bytes*), which gives the same replicates as
+    computing them one at a time.
+    """
     inputData = np.asanyarray(inputData)
     sampIndex = np.random.randint(inputData.shape[0], size=(N, inputData.shape[0]))
 
-    bstat = np.array([bootfunc(inputData[samp, ...], *func_args, **func_kwargs)
-                      for samp in sampIndex])
+    bstat = np.array(_batch_apply(bootfunc, inputData, sampIndex,
+                                  func_args, func_kwargs))
     # Make sure it has at least 2 dims and that the first dim
     # is for the number of times we bootstrapped.
     bstat.shape = (N, -1)
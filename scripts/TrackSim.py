@@ -15,10 +15,24 @@ from ZigZag.TrackFileUtils import *		# for writing the track data
 trackMakers = {}
 
 def MakeTrack(cornerID, initModel, motionModel, deltaT, probTrackEnds, maxLen) :
+    if motionModel.hasTrajectory :
+        # The whole track in one go
+        return MakeTrackBatch(cornerID, 1, initModel, motionModel,
+                              deltaT, probTrackEnds, maxLen)[0]
+
     aPoint = Sim.TrackPoint(cornerID, probTrackEnds, deltaT,
                             initModel, motionModel, maxLen)
     return np.fromiter(aPoint, TrackUtils.track_dtype)
 
+def MakeTrackBatch(cornerID, trackCnt, initModel, motionModel,
+                   deltaT, probTrackEnds, maxLen) :
+    return Sim.BatchTrackPoints(cornerID, initModel.sample(trackCnt),
+                                initModel.useInitState,
+                                probTrackEnds, deltaT, motionModel, maxLen)
+
+# Generators that make many tracks at a time use the batch version.
+MakeTrack.batch = MakeTrackBatch
+
 trackMakers['MakeTrack'] = MakeTrack
 #################################################
 